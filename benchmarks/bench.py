@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+"""
+Measure the throughput of accumulate and batch_accumulate against how
+late they make the reactor, over generators of different cost, batch
+sizes and numbers of concurrent tasks.
+
+Each case runs in its own process, so the reactor starts fresh and the
+peak memory is its own, then all of the results are written as JSON.
+
+Run it with ``make bench``, or ``python benchmarks/bench.py --help``.
+"""
+import argparse
+import hashlib
+import json
+import resource
+import subprocess
+import sys
+from timeit import default_timer
+
+import add_package_path
+
+from twisted.internet import defer
+from twisted.internet.task import LoopingCall
+from twisted.internet.task import react
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+
+
+PROBE_INTERVAL = 0.001
+
+
+def cheap(count):
+    for value in xrange(count):
+        yield value
+
+
+def medium(count):
+    for value in xrange(count):
+        yield sum(xrange(value % 100))
+
+
+def expensive(count):
+    for value in xrange(count):
+        yield hashlib.sha256(str(value) * 100).hexdigest()
+
+
+GENERATORS = {
+    'cheap': cheap,
+    'medium': medium,
+    'expensive': expensive,
+}
+
+
+def percentile(ordered, fraction):
+    """
+    :param ordered: A sorted list of numbers.
+    :param fraction: Between 0 and 1.
+    :return: The value at fraction of the way through ordered.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LatenessProbe(object):
+    """
+    Records how much later than PROBE_INTERVAL after the previous
+    tick each tick of a LoopingCall happens.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.lateness = []
+        self.previous = None
+        self.loop = LoopingCall(self.tick)
+        self.loop.clock = clock
+
+    def tick(self):
+        now = self.clock.seconds()
+        if self.previous is not None:
+            self.lateness.append(
+                max(0.0, now - self.previous - PROBE_INTERVAL))
+        self.previous = now
+
+    def start(self):
+        self.loop.start(PROBE_INTERVAL, now=True)
+
+    def stop(self):
+        self.loop.stop()
+
+    def summary(self):
+        ordered = sorted(self.lateness)
+        return {
+            'ticks': len(ordered),
+            'p50': percentile(ordered, 0.5),
+            'p90': percentile(ordered, 0.9),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else 0.0,
+        }
+
+
+@defer.inlineCallbacks
+def run_case(reactor, case):
+    """
+    Run case, then print its results as a line of JSON.
+
+    :param reactor: The reactor.
+    :param case: A dict of the generator, batch_size,
+     concurrency and items of the case.
+    """
+    generator = GENERATORS[case['generator']]
+    batch_size = case['batch_size']
+    probe = LatenessProbe(reactor)
+    probe.start()
+
+    started = default_timer()
+    if batch_size == 1:
+        tasks = [accumulate(generator(case['items']))
+                 for _ in range(case['concurrency'])]
+    else:
+        tasks = [batch_accumulate(batch_size, generator(case['items']))
+                 for _ in range(case['concurrency'])]
+    yield defer.gatherResults(tasks)
+    elapsed = default_timer() - started
+
+    probe.stop()
+    result = dict(case)
+    result.update({
+        'seconds': elapsed,
+        'items_per_second': case['items'] * case['concurrency'] / elapsed,
+        'lateness': probe.summary(),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+    sys.stdout.write(json.dumps(result) + '\n')
+
+
+def cases(options):
+    """
+    :param options: The parsed command line options.
+    :return: A list of a dict for each case to run.
+    """
+    return [{'generator': generator,
+             'batch_size': batch_size,
+             'concurrency': concurrency,
+             'items': options.items}
+            for generator in options.generators
+            for batch_size in options.batch_sizes
+            for concurrency in options.concurrency]
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=100000,
+                        help='Values yielded by each generator.')
+    parser.add_argument('--generators', nargs='+',
+                        default=sorted(GENERATORS), choices=sorted(GENERATORS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int,
+                        default=[1, 10, 100, 1000, 10000],
+                        help='1 runs accumulate, the rest batch_accumulate.')
+    parser.add_argument('--concurrency', nargs='+', type=int,
+                        default=[1, 4, 16],
+                        help='Numbers of tasks to run at once.')
+    parser.add_argument('--output', default='-',
+                        help='File to write the JSON results to.')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+def main(args):
+    options = parse_args(args)
+    if options.case:
+        react(run_case, [json.loads(options.case)])
+
+    results = []
+    for case in cases(options):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--case', json.dumps(case)])
+        results.append(json.loads(output.splitlines()[-1]))
+        sys.stderr.write(
+            '{generator} batch_size={batch_size} concurrency={concurrency}: '
+            '{items_per_second:.0f} items/s, '
+            'p99 lateness {p99:.4f}s\n'.format(
+                p99=results[-1]['lateness']['p99'], **results[-1]))
+
+    report = json.dumps({'python': sys.version, 'results': results},
+                        indent=2, sort_keys=True)
+    if options.output == '-':
+        sys.stdout.write(report + '\n')
+    else:
+        with open(options.output, 'w') as output_file:
+            output_file.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+"""
+Compare cooperative.aio.batch_accumulate with running the same
+generators in loop.run_in_executor, by throughput and by how late
+they make a heartbeat on the event loop.
+
+Requires Python 3. Run it with ``make bench_aio``, or
+``python3 benchmarks/bench_aio.py --help``.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+from collections import deque
+from timeit import default_timer
+
+import add_package_path
+
+from cooperative import aio
+
+
+PROBE_INTERVAL = 0.001
+
+
+def expensive(count):
+    for value in range(count):
+        yield hashlib.sha256(str(value).encode() * 100).hexdigest()
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def probe(lateness, stop):
+    """
+    Record how late each heartbeat wakes up until stop is set.
+    """
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        scheduled = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lateness.append(max(0.0, loop.time() - scheduled))
+
+
+def in_executor(count):
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(
+        None, lambda: deque(value for value in expensive(count)
+                            if value is not None))
+
+
+async def run_case(mode, batch_size, concurrency, items):
+    lateness = []
+    stop = asyncio.Event()
+    probing = asyncio.ensure_future(probe(lateness, stop))
+
+    started = default_timer()
+    if mode == 'executor':
+        tasks = [in_executor(items) for _ in range(concurrency)]
+    else:
+        tasks = [aio.batch_accumulate(batch_size, expensive(items))
+                 for _ in range(concurrency)]
+    await asyncio.gather(*tasks)
+    elapsed = default_timer() - started
+
+    stop.set()
+    await probing
+    ordered = sorted(lateness)
+    return {
+        'mode': mode,
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'items': items,
+        'seconds': elapsed,
+        'items_per_second': items * concurrency / elapsed,
+        'lateness': {
+            'ticks': len(ordered),
+            'p50': percentile(ordered, 0.5),
+            'p99': percentile(ordered, 0.99),
+            'max': ordered[-1] if ordered else 0.0,
+        },
+    }
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--batch-sizes', nargs='+', type=int,
+                        default=[10, 100, 1000])
+    parser.add_argument('--concurrency', nargs='+', type=int,
+                        default=[1, 4])
+    parser.add_argument('--output', default='-')
+    return parser.parse_args(args)
+
+
+def main(args):
+    options = parse_args(args)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    results = []
+    for concurrency in options.concurrency:
+        cases = [('executor', None)] + [('aio', batch_size)
+                                        for batch_size in options.batch_sizes]
+        for mode, batch_size in cases:
+            results.append(loop.run_until_complete(
+                run_case(mode, batch_size, concurrency, options.items)))
+            sys.stderr.write(
+                '{mode} batch_size={batch_size} concurrency={concurrency}: '
+                '{items_per_second:.0f} items/s, '
+                'p99 lateness {p99:.4f}s\n'.format(
+                    p99=results[-1]['lateness']['p99'], **results[-1]))
+    loop.close()
+
+    report = json.dumps({'python': sys.version, 'results': results},
+                        indent=2, sort_keys=True)
+    if options.output == '-':
+        sys.stdout.write(report + '\n')
+    else:
+        with open(options.output, 'w') as output_file:
+            output_file.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
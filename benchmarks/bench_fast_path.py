@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# _*_ coding: utf-8 _*_
+"""
+Measure the cost per item of consuming a batch and accumulating its
+values, through stream_tap and i_batch against i_fast_batch, without
+the reactor, for each kind of bucket.
+
+Run it with ``make bench_fast_path``, or
+``python benchmarks/bench_fast_path.py --help``.
+"""
+import argparse
+import json
+import sys
+from timeit import default_timer
+
+import add_package_path
+
+from stream_tap import stream_tap
+from iter_karld_tools import i_batch
+
+from cooperative import i_fast_batch
+from cooperative import make_bucket
+
+
+def values(count, none_every):
+    """
+    :return: A list of count numbers, with every none_every-th None.
+    """
+    return [None if none_every and value % none_every == 0 else value
+            for value in range(count)]
+
+
+def tapped(max_size, iterable, spigot):
+    return i_batch(max_size, stream_tap((spigot,), iterable))
+
+
+ENGINES = {
+    'stream_tap': tapped,
+    'fast': i_fast_batch,
+}
+
+
+def run_case(engine, typecode, batch_size, items, none_every, repeat):
+    """
+    :return: A dict of the case and the least seconds per item
+     of repeat runs.
+    """
+    source = values(items, none_every)
+    best = None
+    for _ in range(repeat):
+        spigot = make_bucket(typecode)
+        started = default_timer()
+        for _ in ENGINES[engine](batch_size, iter(source), spigot):
+            pass
+        elapsed = default_timer() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'engine': engine,
+        'typecode': typecode,
+        'batch_size': batch_size,
+        'items': items,
+        'none_every': none_every,
+        'ns_per_item': best / items * 1e9,
+    }
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--batch-sizes', nargs='+', type=int,
+                        default=[100, 1000, 10000])
+    parser.add_argument('--typecodes', nargs='+', default=['none', 'd'],
+                        help='Array typecodes, none for a deque.')
+    parser.add_argument('--none-every', type=int, default=10,
+                        help='Make every nth value None, 0 for none.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='-')
+    return parser.parse_args(args)
+
+
+def main(args):
+    options = parse_args(args)
+    results = []
+    for typecode in options.typecodes:
+        typecode = None if typecode == 'none' else typecode
+        for batch_size in options.batch_sizes:
+            for engine in sorted(ENGINES, reverse=True):
+                results.append(run_case(engine, typecode, batch_size,
+                                        options.items, options.none_every,
+                                        options.repeat))
+            slow, fast = results[-2:]
+            sys.stderr.write(
+                'typecode={typecode} batch_size={batch_size}: '
+                '{slow:.0f} ns/item with stream_tap, {fast:.0f} with '
+                'i_fast_batch, {speedup:.1f}x\n'.format(
+                    typecode=typecode, batch_size=batch_size,
+                    slow=slow['ns_per_item'], fast=fast['ns_per_item'],
+                    speedup=slow['ns_per_item'] / fast['ns_per_item']))
+
+    report = json.dumps({'python': sys.version, 'results': results},
+                        indent=2, sort_keys=True)
+    if options.output == '-':
+        sys.stdout.write(report + '\n')
+    else:
+        with open(options.output, 'w') as output_file:
+            output_file.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,12 @@
 # _*_ coding: utf-8 _*_
 # -*- test-case-name: cooperative.tests.test_cooperative -*-
+from array import array
 from collections import deque
+from functools import partial
+from functools import reduce
+from itertools import islice
+from operator import is_not
+from timeit import default_timer
 
 from cooperative import _meta
 
@@ -8,11 +14,32 @@ __version__ = _meta.version
 __version_info__ = _meta.version_info
 
 
+from twisted.internet.defer import CancelledError
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import DeferredList
+from twisted.internet.defer import FirstError
+from twisted.internet.defer import TimeoutError
+from twisted.internet.defer import gatherResults
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.task import Cooperator
+from twisted.internet.task import TaskFinished
 from twisted.internet.task import cooperate
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.failure import Failure
+
+from cooperative.metrics import instrument
 
 from stream_tap import stream_tap
 from iter_karld_tools import i_batch
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_not_none = partial(is_not, None)
+
 
 class ValueBucket(object):
     """
@@ -23,12 +50,28 @@ class ValueBucket(object):
     to make room for new content.
     """
     def __init__(self):
-        self._contents = deque()
+        self._contents = self._new_contents()
+
+    def _new_contents(self):
+        """
+        :returns: A new, empty container of the contents.
+        """
+        return deque()
 
     def __call__(self, value):
         if value is not None:
             self._contents.append(value)
 
+    def extend(self, values):
+        """
+        Accumulate all of the values of a chunk, unless it is None.
+        The values themselves are not checked for None.
+
+        :param values: A sequence of values.
+        """
+        if values is not None:
+            self._contents.extend(values)
+
     def contents(self):
         """
         :returns: contents
@@ -41,43 +84,663 @@ class ValueBucket(object):
         and returns all of existing contents.
         """
         existing_contents = self._contents
-        self._contents = deque()
+        self._contents = self._new_contents()
         return existing_contents
 
 
+class ArrayBucket(ValueBucket):
+    """
+    A ValueBucket whose contents are an array.array of typecode,
+    which stores numbers far more compactly than a deque.
+
+    On Python 3, memoryview of the contents shares their memory,
+    but on Python 2, array.array only has the old buffer interface,
+    so only the contents of a NumpyBucket support memoryview there.
+    """
+    def __init__(self, typecode):
+        self._typecode = typecode
+        ValueBucket.__init__(self)
+
+    def _new_contents(self):
+        return array(self._typecode)
+
+
+class NumpyBucket(object):
+    """
+    Produces a callable that accumulates all non-None values
+    it is called with in order, in a numpy array of dtype,
+    which doubles in size whenever it is full.
+
+    The contents may be accessed or collected and drained,
+    to make room for new content.
+
+    Requires numpy.
+    """
+    def __init__(self, dtype, capacity=1024):
+        if numpy is None:
+            raise ImportError("NumpyBucket requires numpy")
+        self._dtype = dtype
+        self._capacity = capacity
+        self._buffer = numpy.empty(capacity, dtype)
+        self._size = 0
+
+    def __call__(self, value):
+        if value is not None:
+            if self._size == len(self._buffer):
+                self._buffer = numpy.resize(self._buffer,
+                                            2 * len(self._buffer))
+            self._buffer[self._size] = value
+            self._size += 1
+
+    def extend(self, values):
+        """
+        Accumulate all of the values of a chunk, such as a numpy
+        array, unless it is None.
+
+        :param values: A sequence of values.
+        """
+        if values is not None:
+            size = self._size + len(values)
+            if size > len(self._buffer):
+                self._buffer = numpy.resize(
+                    self._buffer, max(size, 2 * len(self._buffer)))
+            self._buffer[self._size:size] = values
+            self._size = size
+
+    def contents(self):
+        """
+        :returns: contents, a view of the filled part of the buffer.
+        """
+        return self._buffer[:self._size]
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self.contents()
+        self._buffer = numpy.empty(self._capacity, self._dtype)
+        self._size = 0
+        return existing_contents
+
+
+def make_bucket(typecode=None, dtype=None):
+    """
+    :param typecode: Optional array.array typecode, such as 'd' or 'l'.
+    :param dtype: Optional numpy dtype.
+    :return: A NumpyBucket for dtype, an ArrayBucket for typecode,
+     or a ValueBucket when neither is given.
+    """
+    if dtype is not None:
+        return NumpyBucket(dtype)
+    if typecode is not None:
+        return ArrayBucket(typecode)
+    return ValueBucket()
+
+
+class ReduceBucket(object):
+    """
+    Produces a callable that folds all non-None values
+    it is called with into a running accumulator, using
+    fn(accumulator, value), in order.
+
+    The accumulator may be accessed or collected and reset
+    to the initial value.
+    """
+    def __init__(self, fn, initial):
+        self._fn = fn
+        self._initial = initial
+        self._accumulator = initial
+
+    def __call__(self, value):
+        if value is not None:
+            self._accumulator = self._fn(self._accumulator, value)
+
+    def extend(self, values):
+        """
+        Fold all of the values of a chunk into the accumulator,
+        unless it is None.
+
+        :param values: A sequence of values.
+        """
+        if values is not None:
+            self._accumulator = reduce(self._fn, values, self._accumulator)
+
+    def contents(self):
+        """
+        :returns: the accumulator
+        """
+        return self._accumulator
+
+    def drain_contents(self):
+        """
+        Resets the accumulator to the initial value
+        and returns the existing accumulator.
+        """
+        existing_accumulator = self._accumulator
+        self._accumulator = self._initial
+        return existing_accumulator
+
+
 def accumulation_handler(stopped_generator, spigot):
     """
     Drain the contents of the bucket from the spigot.
 
     :param stopped_generator: Generator which as stopped
-    :param spigot: a Bucket.
+    :param spigot: a Bucket, ValueBucket or ReduceBucket.
     :return: The contents of the bucket.
     """
     return spigot.drain_contents()
 
 
-def accumulate(a_generator, cooperator=None):
+def i_adaptive_batch(target_duration, iterable, timer=default_timer,
+                     max_size=None):
+    """
+    Generator that iteratively batches items of an iterable,
+    sizing each batch so that consuming it takes about target_duration
+    seconds, based on the measured cost per item of the previous batch.
+
+    The batch size starts at one, at most doubles from one batch to the
+    next and shrinks as soon as items become more expensive.
+
+    :param target_duration: Seconds consuming each batch should take.
+    :type target_duration: float
+    :param iterable: An iterable
+    :type iterable: iter
+    :param timer: Function returning the current time in seconds.
+    :param max_size: Optional upper bound on the size of a batch.
+    :type max_size: int
+    """
+    iterable_items = iter(iterable)
+    batch_size = 1
+    while True:
+        started = timer()
+        items_batch = tuple(islice(iterable_items, batch_size))
+        elapsed = timer() - started
+        if not items_batch:
+            return
+        yield items_batch
+
+        if elapsed > 0:
+            per_item = elapsed / len(items_batch)
+            batch_size = max(1, min(int(round(target_duration / per_item)),
+                                    batch_size * 2))
+        else:
+            batch_size *= 2
+        if max_size:
+            batch_size = min(batch_size, max_size)
+
+
+def i_chunk_batch(max_size, chunks):
+    """
+    Generator that iteratively batches chunks, such as lists or
+    numpy arrays, until the chunks of a batch hold at least max_size
+    values, and consumes the chunks as each batch is yielded.
+
+    :param max_size: Least number of values in each batch,
+     except the last.
+    :type max_size: int
+    :param chunks: An iterable of sized chunks, or None.
+    :type chunks: iter
+    """
+    chunks_batch = []
+    size = 0
+    for chunk in chunks:
+        chunks_batch.append(chunk)
+        if chunk is not None:
+            size += len(chunk)
+        if size >= max_size:
+            yield tuple(chunks_batch)
+            chunks_batch = []
+            size = 0
+    if chunks_batch:
+        yield tuple(chunks_batch)
+
+
+def i_deliver_batches(spigot, sink, batches):
+    """
+    Generator that hands the drained contents of spigot to sink
+    after each batch of batches is consumed.
+
+    When sink returns a Deferred it is yielded, which pauses a
+    cooperative task iterating over this until the Deferred fires.
+
+    :param spigot: a ValueBucket filled as batches are consumed.
+    :param sink: A callable taking a deque of values, which may
+     return a Deferred.
+    :param batches: An iterator of batches.
+    """
+    for _ in batches:
+        contents = spigot.drain_contents()
+        if contents:
+            result = sink(contents)
+            if isinstance(result, Deferred):
+                yield result
+                continue
+        yield
+
+
+def i_fast_batch(max_size, iterable, spigot):
+    """
+    Generator that iteratively batches items of an iterable, up to
+    max_size, and extends spigot with the non-None items of each batch
+    as it is yielded, like i_batch over stream_tap with spigot, but
+    slicing, filtering and extending at C speed where the iterable and
+    spigot allow, instead of passing each item through Python frames.
+
+    :param max_size: Max size of each batch.
+    :type max_size: int
+    :param iterable: An iterable.
+    :param spigot: a ValueBucket, or any bucket with an extend method
+     taking a list of values.
+    """
+    iterable_items = iter(iterable)
+    extend = spigot.extend
+    for items_batch in iter(lambda: tuple(islice(iterable_items, max_size)),
+                            tuple()):
+        extend(list(filter(_not_none, items_batch)))
+        yield items_batch
+
+
+def _i_tapped_batch(max_size, iterable, spigot):
+    """
+    :return: i_fast_batch of iterable if spigot has an extend method,
+     or else i_batch of iterable tapped by spigot.
+    """
+    if hasattr(spigot, 'extend'):
+        return i_fast_batch(max_size, iterable, spigot)
+    return i_batch(max_size, stream_tap((spigot,), iterable))
+
+
+def i_deferred_batch(max_size, iterable, spigot):
+    """
+    Generator that calls spigot with each item of an iterable and
+    yields after each batch of up to max_size items, like stream_tap
+    and i_batch, except that an item which is a Deferred ends the batch.
+
+    A Deferred is yielded instead, which pauses a cooperative task
+    iterating over this until the item fires, and then spigot is
+    called with its result, so results are accumulated in order.
+    The result is passed on unchanged, but a failure, which fails
+    the task, is not.
+
+    :param max_size: Greatest number of items in each batch.
+    :type max_size: int
+    :param iterable: An iterable of values and Deferreds.
+    :param spigot: a ValueBucket, or any callable taking each value.
+    """
+    size = 0
+    for item in iterable:
+        if not isinstance(item, Deferred):
+            spigot(item)
+            size += 1
+            if size >= max_size:
+                size = 0
+                yield
+            continue
+
+        waiting = Deferred()
+
+        def resolved(result, waiting=waiting):
+            if isinstance(result, Failure):
+                waiting.errback(result)
+                return None
+            spigot(result)
+            waiting.callback(None)
+            return result
+
+        item.addBoth(resolved)
+        size = 0
+        yield waiting
+
+
+def i_threaded_batch(max_size, iterable, spigot, threadpool):
+    """
+    Generator that consumes each batch of an iterable, up to
+    max_size, in a thread of threadpool and calls spigot with
+    each item of the batch back on the reactor thread.
+
+    A Deferred is yielded for each batch being consumed, which pauses
+    a cooperative task iterating over this until the batch is ready.
+
+    :param max_size: Max size of each batch.
+    :type max_size: int
+    :param iterable: An iterable, which is only ever advanced
+     from one thread at a time.
+    :param spigot: A callable, such as a ValueBucket.
+    :param threadpool: A started twisted.python.threadpool.ThreadPool.
+    """
+    from twisted.internet import reactor
+
+    iterable_items = iter(iterable)
+    batches = []
+    while True:
+        d = deferToThreadPool(reactor, threadpool,
+                              lambda: tuple(islice(iterable_items, max_size)))
+        d.addCallback(batches.append)
+        yield d
+
+        items_batch = batches.pop()
+        if not items_batch:
+            return
+        for item in items_batch:
+            spigot(item)
+
+
+def i_weighted(weight, iterable, quantum=0.001, timer=default_timer,
+               top_weight=None):
+    """
+    Generator that, each time it is iterated over, earns weight /
+    top_weight() * quantum seconds of credit, and while it has some,
+    consumes items of an iterable for at most about quantum seconds,
+    keeping the time spent as the deficit of the next turns.
+
+    Iterating over several of these in turn shares time between them
+    in proportion to their weights, like deficit round robin: each
+    turn takes no longer than quantum, and those of a lower weight
+    skip turns until their deficit is repaid, but none starve.
+
+    A Deferred consumed from the iterable is yielded right away,
+    so a cooperative task pauses for it as usual.
+
+    :param weight: Relative share of time, such as 1 or 10.
+    :param iterable: An iterable
+    :type iterable: iter
+    :param quantum: Seconds of time a turn may take.
+    :param timer: Function returning the current time in seconds.
+    :param top_weight: Function returning the highest weight of
+     those sharing time, which get a turn every time, or weight
+     if it is None.
+    """
+    iterable_items = iter(iterable)
+    credit = 0.0
+    while True:
+        share = weight / float(top_weight()) if top_weight else 1.0
+        credit = min(credit + share * quantum, quantum)
+        if credit <= 0:
+            yield
+            continue
+
+        result = None
+        spent = 0.0
+        while spent < quantum and not isinstance(result, Deferred):
+            started = timer()
+            try:
+                result = next(iterable_items)
+            except StopIteration:
+                return
+            spent += timer() - started
+        credit -= spent
+
+        if isinstance(result, Deferred):
+            credit = min(credit, 0.0)
+            yield result
+        else:
+            yield
+
+
+class PriorityCooperator(Cooperator):
+    """
+    A Cooperator which shares time between its tasks in proportion
+    to the priority each was started with, instead of giving each
+    the same number of iterations.
+
+    Tasks of the highest running priority get a turn each time round,
+    and those of lower priorities skip turns, so no turn takes much
+    longer than quantum.
+
+    All tasks meant to share time by priority must be started with
+    the same PriorityCooperator.
+    """
+    def __init__(self, quantum=0.001, timer=default_timer, **kwargs):
+        """
+        :param quantum: Seconds of time a task may take each turn,
+         see i_weighted.
+        :param timer: Function returning the current time in seconds.
+
+        Any other keyword arguments are passed to Cooperator.
+        """
+        Cooperator.__init__(self, **kwargs)
+        self._quantum = quantum
+        self._timer = timer
+        self._priorities = []
+
+    def _top_priority(self):
+        return max(self._priorities)
+
+    def cooperate(self, iterator, priority=1):
+        """
+        Start cooperatively iterating over iterator.
+
+        :param iterator: An iterator.
+        :param priority: Relative share of time for this task.
+        :return: a CooperativeTask
+        """
+        self._priorities.append(priority)
+        task = Cooperator.cooperate(
+            self, i_weighted(priority, iterator, self._quantum, self._timer,
+                             self._top_priority))
+        task.whenDone().addBoth(
+            lambda result: self._priorities.remove(priority))
+        return task
+
+
+default_priority_cooperator = PriorityCooperator()
+
+default_cooperator = None
+
+
+def make_cooperator(slice_budget=0.01, delay=0.00000001, clock=None,
+                    timer=default_timer, cooperator_class=Cooperator,
+                    **kwargs):
+    """
+    Make a Cooperator which iterates over its tasks for slice_budget
+    seconds each round, and starts the next round delay seconds
+    after the reactor has had a turn.
+
+    A smaller slice_budget keeps the reactor more responsive to io,
+     a larger one spends less time scheduling rounds. The defaults
+     are those of twisted's module level cooperate.
+
+    :param slice_budget: Seconds to iterate over tasks each round.
+    :param delay: Seconds from the end of a round to the next, such
+     as 0 to start it as soon as the reactor has handled ready io.
+    :param clock: The IReactorTime to schedule rounds with,
+     the reactor if it is None.
+    :param timer: Function returning the current time in seconds.
+    :param cooperator_class: Cooperator, or a subclass such as
+     PriorityCooperator.
+
+    Any other keyword arguments are passed to cooperator_class.
+    :return: A started cooperator_class.
+    """
+    def termination_predicate_factory():
+        end = timer() + slice_budget
+        return lambda: timer() >= end
+
+    def scheduler(tick):
+        scheduling_clock = clock
+        if scheduling_clock is None:
+            from twisted.internet import reactor as scheduling_clock
+        return scheduling_clock.callLater(delay, tick)
+
+    return cooperator_class(
+        terminationPredicateFactory=termination_predicate_factory,
+        scheduler=scheduler, **kwargs)
+
+
+def configure(slice_budget=0.01, delay=0.00000001, clock=None):
+    """
+    Set the slice budget and the delay between rounds of the default
+    cooperators, used when no cooperator is given, for the whole
+    process, see make_cooperator.
+
+    Tasks already started keep running with the previous ones.
+    Calling this with no arguments installs new cooperators with the
+    default slice budget and delay; see reset_configuration to go
+    back to twisted's own cooperator.
+
+    :param slice_budget: Seconds to iterate over tasks each round.
+    :param delay: Seconds from the end of a round to the next.
+    :param clock: The IReactorTime to schedule rounds with,
+     the reactor if it is None.
+    :return: The new default Cooperator.
+    """
+    global default_cooperator, default_priority_cooperator
+    default_cooperator = make_cooperator(slice_budget, delay, clock)
+    default_priority_cooperator = make_cooperator(
+        slice_budget, delay, clock, cooperator_class=PriorityCooperator)
+    return default_cooperator
+
+
+def reset_configuration():
+    """
+    Undo configure, so tasks started without a cooperator are
+    iterated over by twisted's module level cooperator again,
+    and those with a priority by a new PriorityCooperator.
+
+    Tasks already started keep running with the previous ones.
+    """
+    global default_cooperator, default_priority_cooperator
+    default_cooperator = None
+    default_priority_cooperator = PriorityCooperator()
+
+
+def _cooperate_with(cooperator, priority=None):
+    """
+    :param cooperator: A Cooperator or None.
+    :param priority: Optional priority, which requires cooperator
+     to be a PriorityCooperator or None.
+    :return: The cooperate function of cooperator, or if it is None,
+     of default_cooperator once configured, or else twisted's module
+     level cooperate, or the cooperate function of
+     default_priority_cooperator with the priority.
+    """
+    if priority is not None:
+        if not cooperator:
+            cooperator = default_priority_cooperator
+        return partial(cooperator.cooperate, priority=priority)
+    if cooperator:
+        return cooperator.cooperate
+    if default_cooperator:
+        return default_cooperator.cooperate
+    return cooperate
+
+
+def when_done(task, spigot, timeout=None, partial_results=False,
+              clock=None):
+    """
+    Start a Deferred whose callBack arg is the drained contents of
+    spigot once task is done, which stops task when it is cancelled.
+
+    :param task: A CooperativeTask filling spigot.
+    :param spigot: a ValueBucket, or any bucket with drain_contents.
+    :param timeout: Optional seconds after which the Deferred
+     is cancelled, failing with a TimeoutError.
+    :param partial_results: When True, cancelling the Deferred, or the
+     timeout, fires it with the contents accumulated so far
+     instead of failing.
+    :param clock: The IReactorTime for the timeout,
+     the reactor if it is None.
+    :return: A Deferred to which the next callback will be called with
+     the contents of the spigot.
+    """
+    cancelled = []
+
+    def cancel(d):
+        cancelled.append(True)
+        try:
+            task.stop()
+        except TaskFinished:
+            pass
+        if partial_results:
+            d.callback(spigot.drain_contents())
+
+    d = Deferred(cancel)
+
+    def forward(result):
+        if cancelled:
+            return
+        if isinstance(result, Failure):
+            d.errback(result)
+        else:
+            d.callback(accumulation_handler(result, spigot))
+
+    task.whenDone().addBoth(forward)
+
+    if timeout is not None:
+        if clock is None:
+            from twisted.internet import reactor as clock
+        timed_out = []
+
+        def time_out():
+            timed_out.append(True)
+            d.cancel()
+
+        delayed_call = clock.callLater(timeout, time_out)
+
+        def cancel_time_out(result):
+            if delayed_call.active():
+                delayed_call.cancel()
+            if timed_out and isinstance(result, Failure):
+                result.trap(CancelledError)
+                raise TimeoutError(timeout)
+            return result
+
+        d.addBoth(cancel_time_out)
+    return d
+
+
+def accumulate(a_generator, cooperator=None, threadpool=None,
+               typecode=None, dtype=None, priority=None,
+               timeout=None, partial_results=False, clock=None,
+               spigot=None, thread_batch_size=1000):
     """
     Start a Deferred whose callBack arg is a deque of the accumulation
     of the values yielded from a_generator.
 
+    Given a threadpool, a_generator is iterated over in batches the
+     size of thread_batch_size, like batch_accumulate, since each
+     batch costs a round trip to a thread and back to the reactor.
+
     :param a_generator: An iterator which yields some not None values.
+    :param threadpool: Optional started ThreadPool to iterate over
+     a_generator in, see batch_accumulate.
+    :param typecode: Optional array.array typecode to accumulate
+     numbers in instead of a deque, see batch_accumulate.
+    :param dtype: Optional numpy dtype to accumulate numbers in
+     instead of a deque, see batch_accumulate.
+    :param priority: Optional relative share of time, see batch_accumulate.
+    :param timeout: Optional seconds to stop after, see batch_accumulate.
+    :param partial_results: Whether to fire with the values accumulated
+     so far when cancelled, see batch_accumulate.
+    :param clock: The IReactorTime for the timeout,
+     the reactor if it is None.
+    :param spigot: Optional bucket to accumulate in, see batch_accumulate.
+    :param thread_batch_size: The number of iterations of the generator
+     to consume in a thread at a time, given a threadpool.
     :return: A Deferred to which the next callback will be called with
      the yielded contents of the generator function.
     """
-    if cooperator:
-        own_cooperate = cooperator.cooperate
-    else:
-        own_cooperate = cooperate
+    if threadpool is not None:
+        return batch_accumulate(thread_batch_size, a_generator, cooperator,
+                                threadpool, typecode, dtype, priority,
+                                timeout, partial_results, clock, spigot)
 
-    spigot = ValueBucket()
+    own_cooperate = _cooperate_with(cooperator, priority)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
+
+    if spigot is None:
+        spigot = make_bucket(typecode, dtype)
     items = stream_tap((spigot,), a_generator)
-    d = own_cooperate(items).whenDone()
-    d.addCallback(accumulation_handler, spigot)
-    return d
+    return when_done(own_cooperate(items), spigot,
+                     timeout, partial_results, clock)
 
 
-def batch_accumulate(max_batch_size, a_generator, cooperator=None):
+def batch_accumulate(max_batch_size, a_generator, cooperator=None,
+                     threadpool=None, typecode=None, dtype=None,
+                     priority=None, timeout=None, partial_results=False,
+                     clock=None, spigot=None, wait_for_deferreds=False):
     """
     Start a Deferred whose callBack arg is a deque of the accumulation
     of the values yielded from a_generator which is iterated over
@@ -86,20 +749,314 @@ def batch_accumulate(max_batch_size, a_generator, cooperator=None):
     It should be more efficient to iterate over the generator in
      batches and still provide enough speed for non-blocking execution.
 
+    Given a threadpool, each batch is consumed in one of its threads
+     instead of the reactor thread, which runs in parallel with other
+     work when the generator releases the GIL, such as in zlib,
+     hashlib or NumPy. The values are still accumulated on the
+     reactor thread, and the maxthreads of the threadpool limits
+     how many batches are consumed at once.
+
+    Given a typecode or a dtype, the values, which must all be numbers
+     of that type, are accumulated in an array.array or numpy array
+     instead of a deque, using a fraction of the memory, and the
+     callBack arg is that array.
+
+    Given a spigot, the values are accumulated in it instead, and the
+     callBack arg is what its drain_contents returns. A spigot is any
+     callable taking each value, with a drain_contents method, such
+     as cooperative.spill.SpillBucket. If it also has an extend method,
+     that is called with a list of the non-None values of each batch
+     instead, which is much faster.
+
+    With wait_for_deferreds, a Deferred yielded by the generator, such
+     as for a database query, ends its batch and pauses iterating over
+     the generator until it fires, then its result is accumulated
+     instead of the Deferred, so the generator can interleave io with
+     computing values. The threadpool is not used then.
+
+    Cancelling the Deferred stops iterating over the generator right
+     away. It then fails with a CancelledError, or, when
+     partial_results is True, fires with the values accumulated so
+     far. Given a timeout, it is cancelled after that many seconds,
+     failing with a TimeoutError instead. To stop at a deadline, pass
+     the seconds until it, such as deadline - reactor.seconds().
+
     :param max_batch_size: The number of iterations of the generator
      to consume at a time.
     :param a_generator: An iterator which yields some not None values.
+    :param threadpool: Optional started
+     twisted.python.threadpool.ThreadPool to iterate over a_generator in.
+    :param typecode: Optional array.array typecode, such as 'd' or 'l'.
+    :param dtype: Optional numpy dtype, such as 'float64'.
+    :param priority: Optional relative share of time compared to other
+     tasks of cooperator, which must then be a PriorityCooperator,
+     or default_priority_cooperator if it is None.
+    :param timeout: Optional seconds after which to stop.
+    :param partial_results: When True, fire with the values
+     accumulated so far when cancelled or timed out.
+    :param clock: The IReactorTime for the timeout,
+     the reactor if it is None.
+    :param spigot: Optional bucket to accumulate in.
+    :param wait_for_deferreds: When True, wait for Deferreds yielded
+     by the generator and accumulate their results.
     :return: A Deferred to which the next callback will be called with
      the yielded contents of the generator function.
     """
-    if cooperator:
-        own_cooperate = cooperator.cooperate
+    own_cooperate = _cooperate_with(cooperator, priority)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
+
+    if spigot is None:
+        spigot = make_bucket(typecode, dtype)
+    if wait_for_deferreds:
+        batches = i_deferred_batch(max_batch_size, a_generator, spigot)
+    elif threadpool is None:
+        batches = _i_tapped_batch(max_batch_size, a_generator, spigot)
     else:
-        own_cooperate = cooperate
+        batches = i_threaded_batch(max_batch_size, a_generator,
+                                   spigot, threadpool)
+
+    return when_done(own_cooperate(batches), spigot,
+                     timeout, partial_results, clock)
+
+
+def batch_reduce(fn, initial, max_batch_size, a_generator, cooperator=None):
+    """
+    Start a Deferred whose callBack arg is the result of folding
+    the values yielded from a_generator into initial with fn,
+    like reduce, while iterating over it in batches the size
+    of max_batch_size.
+
+    Only the running accumulator is kept, so memory does not grow
+     with the number of values yielded.
+
+    :param fn: A function of two arguments, the accumulator and a
+     value, which returns the new accumulator.
+    :param initial: The starting value of the accumulator.
+    :param max_batch_size: The number of iterations of the generator
+     to consume at a time.
+    :param a_generator: An iterator which yields some not None values.
+    :return: A Deferred to which the next callback will be called with
+     the final accumulator.
+    """
+    own_cooperate = _cooperate_with(cooperator)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
+
+    spigot = ReduceBucket(fn, initial)
+    batches = i_fast_batch(max_batch_size, a_generator, spigot)
+
+    return when_done(own_cooperate(batches), spigot)
+
+
+def batch_stream(max_batch_size, a_generator, sink, cooperator=None):
+    """
+    Start a Deferred which fires with None after sink has been
+    called with a deque of the values yielded from a_generator
+    for each batch the size of max_batch_size it is iterated over in.
+
+    If sink returns a Deferred, the generator is not iterated
+     over again until it fires, so a slow consumer applies
+     backpressure and only one batch is held at a time.
+
+    :param max_batch_size: The number of iterations of the generator
+     to consume at a time.
+    :param a_generator: An iterator which yields some not None values.
+    :param sink: A callable taking a deque of values, which may
+     return a Deferred.
+    :return: A Deferred which fires with None once every batch has been
+     delivered, or fails with an error from a_generator or sink.
+    """
+    own_cooperate = _cooperate_with(cooperator)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
+
+    spigot = ValueBucket()
+    deliveries = i_deliver_batches(
+        spigot, sink, i_fast_batch(max_batch_size, a_generator, spigot))
+
+    d = when_done(own_cooperate(deliveries), spigot)
+    d.addCallback(lambda _: None)
+    return d
+
+
+def chunk_accumulate(max_batch_size, a_generator, cooperator=None,
+                     typecode=None, dtype=None):
+    """
+    Start a Deferred whose callBack arg is a deque of the accumulation
+    of the values of each chunk yielded from a_generator, which is
+    iterated over in batches of about max_batch_size values.
+
+    Yielding a whole chunk of values at a time, such as a list or a
+     numpy array computed by vectorized code, avoids the overhead of
+     a function call per value, while the batches are still counted in
+     values rather than in chunks. The values of a chunk are not
+     checked for None, a None chunk is skipped.
+
+    :param max_batch_size: The least number of values to consume
+     from the generator at a time.
+    :param a_generator: An iterator which yields sized chunks of values.
+    :param typecode: Optional array.array typecode, see batch_accumulate.
+    :param dtype: Optional numpy dtype, see batch_accumulate.
+    :return: A Deferred to which the next callback will be called with
+     the values of the yielded chunks of the generator function.
+    """
+    own_cooperate = _cooperate_with(cooperator)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
+
+    spigot = make_bucket(typecode, dtype)
+    chunks = stream_tap((spigot.extend,), a_generator)
+
+    return when_done(own_cooperate(i_chunk_batch(max_batch_size, chunks)),
+                     spigot)
+
+
+def adaptive_batch_accumulate(target_duration, a_generator, cooperator=None,
+                              max_batch_size=None):
+    """
+    Start a Deferred whose callBack arg is a deque of the accumulation
+    of the values yielded from a_generator which is iterated over
+    in batches sized to take about target_duration seconds each.
+
+    Use this instead of batch_accumulate when the cost of each
+     iteration is unknown or varies, so the reactor is held for about
+     target_duration per batch while as many items as possible are
+     consumed.
+
+    :param target_duration: Seconds consuming each batch of the
+     generator should take, such as 0.002.
+    :param a_generator: An iterator which yields some not None values.
+    :param max_batch_size: Optional upper bound on the number of
+     iterations of the generator to consume at a time.
+    :return: A Deferred to which the next callback will be called with
+     the yielded contents of the generator function.
+    """
+    own_cooperate = _cooperate_with(cooperator)
+    a_generator, own_cooperate = instrument(a_generator, own_cooperate)
 
     spigot = ValueBucket()
     items = stream_tap((spigot,), a_generator)
 
-    d = own_cooperate(i_batch(max_batch_size, items)).whenDone()
-    d.addCallback(accumulation_handler, spigot)
+    batches = i_adaptive_batch(target_duration, items,
+                               max_size=max_batch_size)
+    return when_done(own_cooperate(batches), spigot)
+
+
+def cooperative_map(fn, inputs, concurrency=10, max_batch_size=1,
+                    cooperator=None, ordered=True, sink=None):
+    """
+    Start a Deferred whose callBack arg is a list of the accumulations
+    of the values yielded from fn(an_input), for each of inputs, with
+    at most concurrency of them iterated over at a time, each in
+    batches the size of max_batch_size.
+
+    The next input is only started as one finishes, so there are never
+     more than concurrency generators and buckets at once, and when
+     ordered, no input is started while concurrency accumulations are
+     finished but waiting on an earlier input.
+
+    Given a sink, it is called with the index of each input and its
+     accumulation as each finishes instead, and the Deferred fires
+     with None. When sink returns a Deferred, that input is not
+     considered finished until it fires.
+
+    Any error fails the Deferred right away, cancelling the
+     accumulations still running, and no other input is started.
+     Cancelling the Deferred likewise stops them all.
+
+    :param fn: A function taking one input and returning an iterator
+     which yields some not None values.
+    :param inputs: An iterable of inputs.
+    :param concurrency: How many inputs to iterate over at a time,
+     at least 1.
+    :param max_batch_size: The number of iterations of each generator
+     to consume at a time.
+    :param ordered: Whether the results, or the calls to sink, are in
+     the order of inputs, rather than the order they finish in, when
+     each result is a tuple of the index of its input and it.
+    :param sink: Optional callable taking an index and an accumulation,
+     which may return a Deferred.
+    :return: A Deferred to which the next callback will be called with
+     the list of accumulations, or of tuples of an index and an
+     accumulation when not ordered, or None given a sink.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1.")
+    own_cooperate = _cooperate_with(cooperator)
+    results = []
+    finished = {}
+    waiting = []
+    pending = set()
+    tasks = []
+    stopped = []
+    next_index = [0]
+
+    def unwrap(failure):
+        failure.trap(FirstError)
+        return failure.value.subFailure
+
+    def deliver(index, result):
+        if sink is not None:
+            return sink(index, result)
+        results.append(result if ordered else (index, result))
+
+    def flush(result, index):
+        if not ordered:
+            return deliver(index, result)
+        finished[index] = result
+        delivered = []
+        while next_index[0] in finished:
+            delivered.append(maybeDeferred(
+                deliver, next_index[0], finished.pop(next_index[0])))
+            next_index[0] += 1
+        if len(finished) >= concurrency:
+            waiting.append(Deferred())
+            return waiting[-1]
+        release()
+        return gatherResults(delivered, consumeErrors=True).addErrback(unwrap)
+
+    def release():
+        while waiting:
+            waiter = waiting.pop()
+            if not waiter.called:
+                waiter.callback(None)
+
+    def stop():
+        stopped.append(True)
+        for task in tasks:
+            try:
+                task.stop()
+            except TaskFinished:
+                pass
+        for pending_d in list(pending):
+            pending_d.cancel()
+
+    def forget(result, work_d):
+        pending.discard(work_d)
+        return result
+
+    def fail(failure):
+        if not stopped:
+            stop()
+            d.errback(failure)
+
+    def i_work():
+        for index, an_input in enumerate(inputs):
+            if stopped:
+                return
+            work_d = maybeDeferred(fn, an_input)
+            pending.add(work_d)
+            work_d.addCallback(lambda a_generator: batch_accumulate(
+                max_batch_size, a_generator, cooperator))
+            work_d.addCallback(flush, index)
+            work_d.addBoth(forget, work_d)
+            work_d.addErrback(fail)
+            yield work_d
+
+    def done(_):
+        if not stopped:
+            d.callback(None if sink is not None else results)
+
+    d = Deferred(lambda _: stop())
+    work = i_work()
+    tasks.extend(own_cooperate(work) for _ in range(concurrency))
+    DeferredList([task.whenDone() for task in tasks],
+                 consumeErrors=True).addCallback(done)
     return d
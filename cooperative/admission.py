@@ -0,0 +1,164 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_admission -*-
+"""
+Limit how many accumulations run at once, queueing the rest, so under
+a spike of work each running task keeps a useful share of the
+cooperator and the latency of each stays predictable.
+"""
+import heapq
+from itertools import count
+from timeit import default_timer
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import fail
+from twisted.internet.defer import maybeDeferred
+from twisted.python.failure import Failure
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+from cooperative.probe import LagHistogram
+
+
+class QueueFull(Exception):
+    """
+    The wait queue of an AdmissionController is full.
+    """
+
+
+_QUEUED = 'queued'
+_ACTIVE = 'active'
+_CANCELLED = 'cancelled'
+
+
+class AdmissionController(object):
+    """
+    Starts at most max_active calls at once, and queues the rest
+    to start as running ones finish, highest priority first,
+    and of equal priority, first in first out.
+
+    Share one between all of the callers whose accumulations
+    should be limited together.
+    """
+    def __init__(self, max_active=8, max_queued=None, timer=default_timer):
+        """
+        :param max_active: How many calls to run at once.
+        :param max_queued: Optional limit on how many calls to queue,
+         past which calls fail with QueueFull.
+        :param timer: Function returning the current time in seconds.
+        """
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self._timer = timer
+        self._queue = []
+        self._ids = count()
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_times = LagHistogram()
+
+    def call(self, start, priority=0):
+        """
+        Start a Deferred whose callBack arg is that of start(), once
+        fewer than max_active calls are running.
+
+        Cancelling the Deferred removes the call from the queue,
+        or cancels the Deferred of start if it is running.
+
+        :param start: A function returning a Deferred.
+        :param priority: Calls of a higher priority are started first.
+        :return: A Deferred, which fails with QueueFull if the queue
+         is full.
+        """
+        if self.active >= self.max_active:
+            if self.max_queued is not None and self.queued >= self.max_queued:
+                self.rejected += 1
+                return fail(QueueFull(self.queued))
+
+        # priority, order, state, start, queued at, Deferred, running
+        entry = [-priority, next(self._ids), _QUEUED, start,
+                 self._timer(), None, None]
+        entry[5] = Deferred(lambda d: self._cancel(entry))
+        if self.active < self.max_active:
+            self._start(entry)
+        else:
+            heapq.heappush(self._queue, entry)
+            self.queued += 1
+        return entry[5]
+
+    def accumulate(self, a_generator, queue_priority=0, **kwargs):
+        """
+        Like accumulate(a_generator, **kwargs), once admitted.
+
+        :param a_generator: An iterator which yields some not None values.
+        :param queue_priority: The priority in the queue.
+        :param kwargs: Keyword arguments of accumulate.
+        :return: A Deferred to which the next callback will be called
+         with the yielded contents of the generator function.
+        """
+        return self.call(lambda: accumulate(a_generator, **kwargs),
+                         queue_priority)
+
+    def batch_accumulate(self, max_batch_size, a_generator,
+                         queue_priority=0, **kwargs):
+        """
+        Like batch_accumulate(max_batch_size, a_generator, **kwargs),
+        once admitted.
+
+        :param max_batch_size: The number of iterations of the generator
+         to consume at a time.
+        :param a_generator: An iterator which yields some not None values.
+        :param queue_priority: The priority in the queue.
+        :param kwargs: Keyword arguments of batch_accumulate.
+        :return: A Deferred to which the next callback will be called
+         with the yielded contents of the generator function.
+        """
+        return self.call(
+            lambda: batch_accumulate(max_batch_size, a_generator, **kwargs),
+            queue_priority)
+
+    def _start(self, entry):
+        entry[2] = _ACTIVE
+        self.active += 1
+        self.admitted += 1
+        self.wait_times.record(self._timer() - entry[4])
+        entry[6] = maybeDeferred(entry[3])
+        entry[6].addBoth(self._finish, entry)
+
+    def _finish(self, result, entry):
+        self.active -= 1
+        d = entry[5]
+        if not d.called:
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+        self._start_queued()
+
+    def _start_queued(self):
+        while self._queue and self.active < self.max_active:
+            entry = heapq.heappop(self._queue)
+            if entry[2] == _CANCELLED:
+                continue
+            self.queued -= 1
+            self._start(entry)
+
+    def _cancel(self, entry):
+        if entry[2] == _QUEUED:
+            entry[2] = _CANCELLED
+            self.queued -= 1
+        elif entry[2] == _ACTIVE:
+            entry[6].cancel()
+
+    def stats(self):
+        """
+        :return: A dict of the calls running, queued, admitted and
+         rejected, and a summary of how long admitted calls waited.
+        """
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'wait': self.wait_times.snapshot(),
+        }
@@ -0,0 +1,322 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_aggregate -*-
+"""
+Buckets which keep a summary of the values they are called with,
+in memory bounded by their size rather than by the number of values,
+to pass as the spigot of accumulate or batch_accumulate.
+"""
+import heapq
+from math import ceil
+from math import log
+from random import Random
+
+
+class _SummaryBucket(object):
+    """
+    A bucket which accumulates a chunk by calling itself with each
+    of its values, for the buckets here to share.
+    """
+    def extend(self, values):
+        """
+        Accumulate all of the values of a chunk, unless it is None,
+        skipping any of the values which are None, like calling it
+        with each.
+
+        :param values: A sequence of values.
+        """
+        if values is not None:
+            for value in values:
+                self(value)
+
+
+class TopKBucket(_SummaryBucket):
+    """
+    Keeps the k largest non-None values it is called with, in a heap.
+
+    The contents are a list of them, largest first, and of equal
+    ones, the first called with first.
+    """
+    def __init__(self, k, key=None):
+        """
+        :param k: How many values to keep.
+        :param key: Optional function of a value to compare by.
+        """
+        self._k = k
+        self._key = key
+        self._heap = []
+        self._count = 0
+
+    def __call__(self, value):
+        if value is not None:
+            self._count += 1
+            key = value if self._key is None else self._key(value)
+            entry = (key, -self._count, value)
+            if len(self._heap) < self._k:
+                heapq.heappush(self._heap, entry)
+            elif self._heap and entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def contents(self):
+        """
+        :returns: contents, a list of the largest values.
+        """
+        return [value for _, _, value in sorted(self._heap, reverse=True)]
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self.contents()
+        self._heap = []
+        self._count = 0
+        return existing_contents
+
+
+class ReservoirBucket(_SummaryBucket):
+    """
+    Keeps a uniform random sample of k of the non-None values it is
+    called with, by Algorithm R.
+
+    The contents are a list of the sample, in no particular order.
+    """
+    def __init__(self, k, random=None):
+        """
+        :param k: How many values to sample.
+        :param random: Optional random.Random to sample with,
+         such as a seeded one for a repeatable sample.
+        """
+        self._k = k
+        self._random = random if random is not None else Random()
+        self._sample = []
+        self.count = 0
+
+    def __call__(self, value):
+        if value is not None:
+            self.count += 1
+            if len(self._sample) < self._k:
+                self._sample.append(value)
+            else:
+                index = self._random.randrange(self.count)
+                if index < self._k:
+                    self._sample[index] = value
+
+    def contents(self):
+        """
+        :returns: contents, a list of the sample.
+        """
+        return self._sample
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self._sample
+        self._sample = []
+        self.count = 0
+        return existing_contents
+
+
+class HistogramBucket(_SummaryBucket):
+    """
+    Counts the non-None numbers it is called with in bins of equal
+    width from low up to high, and those below and above them.
+
+    The contents are a dict of the edges of the bins, the count of
+    each bin, and the counts under low and at or over high.
+    """
+    def __init__(self, low, high, bins=10):
+        """
+        :param low: The lower edge of the first bin.
+        :param high: The upper edge of the last bin.
+        :param bins: How many bins.
+        """
+        self._low = low
+        self._high = high
+        self._bins = bins
+        self._width = float(high - low) / bins
+        self._reset()
+
+    def _reset(self):
+        self._counts = [0] * self._bins
+        self._under = 0
+        self._over = 0
+
+    def __call__(self, value):
+        if value is not None:
+            if value < self._low:
+                self._under += 1
+            elif value >= self._high:
+                self._over += 1
+            else:
+                index = int((value - self._low) / self._width)
+                self._counts[min(index, self._bins - 1)] += 1
+
+    def contents(self):
+        """
+        :returns: contents, a dict of the edges, counts, under and over.
+        """
+        return {
+            'edges': [self._low + index * self._width
+                      for index in range(self._bins)] + [self._high],
+            'counts': list(self._counts),
+            'under': self._under,
+            'over': self._over,
+        }
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self.contents()
+        self._reset()
+        return existing_contents
+
+
+class QuantileBucket(_SummaryBucket):
+    """
+    Estimates quantiles of the non-None numbers it is called with,
+    each to within relative_accuracy of a number called with, by
+    counting them in buckets whose bounds grow geometrically, like
+    a DDSketch, so the number of buckets only grows with the
+    logarithm of the range of the numbers.
+
+    The contents are a dict of each of quantiles and its estimate.
+    """
+    def __init__(self, quantiles=(0.5, 0.9, 0.99), relative_accuracy=0.01,
+                 min_value=1e-9):
+        """
+        :param quantiles: The quantiles of the contents,
+         each between 0 and 1.
+        :param relative_accuracy: The relative error of an estimate.
+        :param min_value: Numbers of a smaller magnitude are
+         counted as zero.
+        """
+        self._quantiles = quantiles
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = log(self._gamma)
+        self._min_value = min_value
+        self._reset()
+
+    def _reset(self):
+        self._positive = {}
+        self._negative = {}
+        self._zeros = 0
+        self.count = 0
+
+    def _index(self, magnitude):
+        return int(ceil(log(magnitude) / self._log_gamma))
+
+    def _value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def __call__(self, value):
+        if value is not None:
+            self.count += 1
+            if value > self._min_value:
+                index = self._index(value)
+                self._positive[index] = self._positive.get(index, 0) + 1
+            elif value < -self._min_value:
+                index = self._index(-value)
+                self._negative[index] = self._negative.get(index, 0) + 1
+            else:
+                self._zeros += 1
+
+    def quantile(self, fraction):
+        """
+        :param fraction: Between 0 and 1, such as 0.99.
+        :return: An estimate of the number which fraction of the
+         numbers are at most, or None if there are none.
+        """
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self._zeros
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self._positive))
+
+    def contents(self):
+        """
+        :returns: contents, a dict of each quantile and its estimate.
+        """
+        return dict((fraction, self.quantile(fraction))
+                    for fraction in self._quantiles)
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self.contents()
+        self._reset()
+        return existing_contents
+
+
+class StatsBucket(_SummaryBucket):
+    """
+    Keeps the count, sum, mean, variance, min and max of the non-None
+    numbers it is called with, updating the mean and variance with
+    Welford's algorithm, which stays accurate over many numbers.
+
+    The contents are a dict of them, where variance is the sample
+    variance, and it, mean, min and max are None until there are
+    enough numbers.
+    """
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._count = 0
+        self._sum = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = None
+        self._max = None
+
+    def __call__(self, value):
+        if value is not None:
+            self._count += 1
+            self._sum += value
+            delta = value - self._mean
+            self._mean += delta / float(self._count)
+            self._m2 += delta * (value - self._mean)
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    def contents(self):
+        """
+        :returns: contents, a dict of the count, sum, mean, variance,
+         min and max.
+        """
+        return {
+            'count': self._count,
+            'sum': self._sum,
+            'mean': self._mean if self._count else None,
+            'variance': (self._m2 / (self._count - 1)
+                         if self._count > 1 else None),
+            'min': self._min,
+            'max': self._max,
+        }
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents.
+        """
+        existing_contents = self.contents()
+        self._reset()
+        return existing_contents
@@ -0,0 +1,143 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_aio -*-
+"""
+An asyncio backend for accumulate and batch_accumulate, which return
+awaitable Futures and iterate over generators a slice at a time,
+between iterations of the event loop, instead of using twisted.
+
+Requires Python 3.
+"""
+import asyncio
+from collections import deque
+from timeit import default_timer
+
+from stream_tap import stream_tap
+from iter_karld_tools import i_batch
+
+from cooperative import make_bucket
+
+
+class Cooperator(object):
+    """
+    Iterates over tasks round robin, one iteration of one task at a
+    time, until slice_budget seconds have passed, then lets the event
+    loop handle ready io and callbacks before starting the next round.
+
+    A task which yields a Future is paused until that is done.
+    """
+    def __init__(self, slice_budget=0.01, timer=default_timer):
+        """
+        :param slice_budget: Seconds to iterate over tasks each round.
+        :param timer: Function returning the current time in seconds.
+        """
+        self._slice_budget = slice_budget
+        self._timer = timer
+        self._tasks = deque()
+        self._loop = None
+        self._handle = None
+
+    def cooperate(self, iterator, finish=None):
+        """
+        Start cooperatively iterating over iterator in the event loop.
+
+        Cancelling the Future stops iterating over iterator.
+
+        :param iterator: An iterator.
+        :param finish: Optional function whose return value is the
+         result of the Future once iterator is exhausted.
+        :return: A Future whose result is that of finish, or None.
+        """
+        if not self._tasks and self._handle is None:
+            self._loop = asyncio.get_event_loop()
+        future = self._loop.create_future()
+        self._tasks.append((iter(iterator), future, finish))
+        self._schedule()
+        return future
+
+    def _schedule(self):
+        if self._handle is None and self._tasks:
+            self._handle = self._loop.call_soon(self._tick)
+
+    def _tick(self):
+        self._handle = None
+        end = self._timer() + self._slice_budget
+        while self._tasks and self._timer() < end:
+            self._step(self._tasks.popleft())
+        self._schedule()
+
+    def _step(self, task):
+        iterator, future, finish = task
+        if future.done():
+            return
+        try:
+            result = next(iterator)
+        except StopIteration:
+            future.set_result(finish() if finish else None)
+            return
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        if asyncio.isfuture(result):
+            result.add_done_callback(lambda done: self._resume(task, done))
+        else:
+            self._tasks.append(task)
+
+    def _resume(self, task, done):
+        """
+        Continue iterating over a task paused for a Future.
+
+        :param task: The paused task.
+        :param done: The Future it was paused for.
+        """
+        future = task[1]
+        if future.done():
+            return
+        if not done.cancelled() and done.exception() is not None:
+            future.set_exception(done.exception())
+            return
+        self._tasks.append(task)
+        self._schedule()
+
+
+default_cooperator = Cooperator()
+
+
+def accumulate(a_generator, cooperator=None):
+    """
+    Start a Future whose result is a deque of the accumulation
+    of the values yielded from a_generator.
+
+    :param a_generator: An iterator which yields some not None values.
+    :param cooperator: Optional Cooperator, default_cooperator
+     if it is None.
+    :return: A Future whose result is the yielded contents
+     of the generator function.
+    """
+    cooperator = cooperator or default_cooperator
+
+    spigot = make_bucket()
+    items = stream_tap((spigot,), a_generator)
+    return cooperator.cooperate(items, spigot.drain_contents)
+
+
+def batch_accumulate(max_batch_size, a_generator, cooperator=None):
+    """
+    Start a Future whose result is a deque of the accumulation
+    of the values yielded from a_generator which is iterated over
+    in batches the size of max_batch_size.
+
+    :param max_batch_size: The number of iterations of the generator
+     to consume at a time.
+    :param a_generator: An iterator which yields some not None values.
+    :param cooperator: Optional Cooperator, default_cooperator
+     if it is None.
+    :return: A Future whose result is the yielded contents
+     of the generator function.
+    """
+    cooperator = cooperator or default_cooperator
+
+    spigot = make_bucket()
+    items = stream_tap((spigot,), a_generator)
+    return cooperator.cooperate(i_batch(max_batch_size, items),
+                                spigot.drain_contents)
@@ -0,0 +1,182 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_cache -*-
+"""
+Share the accumulation of a generator between every caller asking
+for the same one, while it runs and for a while after.
+"""
+from collections import OrderedDict
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.defer import succeed
+from twisted.python.failure import Failure
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+
+
+class AccumulationCache(object):
+    """
+    Memoizes accumulations keyed by the generator factory and its
+    arguments, which must be hashable.
+
+    Calls for a key already being accumulated wait for that one
+    accumulation instead of starting another, and finished
+    accumulations are kept, least recently used first out, within
+    max_entries, max_values and ttl. Failures are not kept.
+
+    Every caller of a key is given the same result, which must not
+    be changed.
+    """
+    def __init__(self, max_entries=128, max_values=None, ttl=None,
+                 sizer=len, clock=None):
+        """
+        :param max_entries: How many results to keep.
+        :param max_values: Optional limit on the total size of the
+         results kept.
+        :param ttl: Optional seconds to keep each result for.
+        :param sizer: Function giving the size of a result,
+         for max_values.
+        :param clock: The IReactorTime for the ttl,
+         the reactor if it is None.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self._max_entries = max_entries
+        self._max_values = max_values
+        self._ttl = ttl
+        self._sizer = sizer
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._values = 0
+        self.hits = 0
+        self.joins = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, key):
+        expires, result, size = self._entries.pop(key)
+        self._values -= size
+
+    def _lookup(self, key):
+        """
+        :param key: A key.
+        :return: A tuple of whether a result of key is kept,
+         and the result.
+        """
+        if key not in self._entries:
+            return False, None
+        expires, result, size = self._entries[key]
+        if expires is not None and self._clock.seconds() >= expires:
+            self._evict(key)
+            return False, None
+        del self._entries[key]
+        self._entries[key] = (expires, result, size)
+        return True, result
+
+    def _store(self, key, result):
+        size = self._sizer(result) if self._max_values is not None else 0
+        if self._max_values is not None and size > self._max_values:
+            return
+        expires = None
+        if self._ttl is not None:
+            expires = self._clock.seconds() + self._ttl
+        self._entries[key] = (expires, result, size)
+        self._values += size
+        while (len(self._entries) > self._max_entries or
+               (self._max_values is not None and
+                self._values > self._max_values)):
+            self._evict(next(iter(self._entries)))
+
+    def _finish(self, result, key):
+        waiting = self._in_flight.pop(key)
+        if not isinstance(result, Failure):
+            self._store(key, result)
+        for d in waiting:
+            if d.called:
+                continue
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+
+    def call(self, key, start):
+        """
+        Start a Deferred whose callBack arg is the result kept for key,
+        the result of the call for key in flight, or else of start().
+
+        :param key: A hashable key.
+        :param start: A function returning a Deferred.
+        :return: A Deferred.
+        """
+        found, result = self._lookup(key)
+        if found:
+            self.hits += 1
+            return succeed(result)
+
+        d = Deferred()
+        if key in self._in_flight:
+            self.joins += 1
+            self._in_flight[key].append(d)
+            return d
+
+        self.misses += 1
+        self._in_flight[key] = [d]
+        maybeDeferred(start).addBoth(self._finish, key)
+        return d
+
+    def accumulate(self, generator_factory, *args):
+        """
+        Like accumulate(generator_factory(*args)), shared between calls
+        with the same generator_factory and args.
+
+        :param generator_factory: A function returning an iterator
+         which yields some not None values.
+        :param args: Hashable arguments for generator_factory.
+        :return: A Deferred to which the next callback will be called
+         with the yielded contents of the generator function.
+        """
+        return self.call((generator_factory, args),
+                         lambda: accumulate(generator_factory(*args)))
+
+    def batch_accumulate(self, max_batch_size, generator_factory, *args):
+        """
+        Like batch_accumulate(max_batch_size, generator_factory(*args)),
+        shared between calls with the same generator_factory and args.
+
+        :param max_batch_size: The number of iterations of the generator
+         to consume at a time.
+        :param generator_factory: A function returning an iterator
+         which yields some not None values.
+        :param args: Hashable arguments for generator_factory.
+        :return: A Deferred to which the next callback will be called
+         with the yielded contents of the generator function.
+        """
+        return self.call(
+            (generator_factory, args),
+            lambda: batch_accumulate(max_batch_size,
+                                     generator_factory(*args)))
+
+    def clear(self):
+        """
+        Forget every result kept.
+        """
+        self._entries.clear()
+        self._values = 0
+
+    def stats(self):
+        """
+        :return: A dict of the hits, joins of calls in flight, misses,
+         and the entries and total size of the results kept.
+        """
+        return {
+            'hits': self.hits,
+            'joins': self.joins,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'values': self._values,
+            'in_flight': len(self._in_flight),
+        }
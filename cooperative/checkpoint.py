@@ -0,0 +1,200 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_checkpoint -*-
+"""
+Accumulate generators which run for a long time, periodically saving
+their position and what they have accumulated to a file, so the same
+accumulation resumes from there if the process is restarted.
+
+A checkpointable iterator is an iterator with a position method,
+which returns its position as a picklable value, and a restore method,
+which takes a position and, called before it is iterated over, makes
+it continue from there.
+"""
+import errno
+import os
+import pickle
+from timeit import default_timer
+
+from twisted.internet.threads import deferToThread
+
+from stream_tap import stream_tap
+from iter_karld_tools import i_batch
+
+from cooperative import ValueBucket
+from cooperative import _cooperate_with
+from cooperative import when_done
+from cooperative.metrics import instrument
+
+
+class Replayable(object):
+    """
+    A checkpointable iterator over a generator function, whose position
+    is the number of values it has iterated over.
+
+    It is restored by replaying the generator function from the start,
+    yielding None instead of the values before the position, so that
+    skipping them is still done cooperatively.
+    """
+    def __init__(self, generator_factory, *args):
+        """
+        :param generator_factory: A function returning an iterator.
+        :param args: Arguments for generator_factory.
+        """
+        self._generator_factory = generator_factory
+        self._args = args
+        self._iterator = None
+        self._position = 0
+        self._skip = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._generator_factory(*self._args))
+        value = next(self._iterator)
+        self._position += 1
+        if self._skip:
+            self._skip -= 1
+            return None
+        return value
+
+    next = __next__
+
+    def position(self):
+        """
+        :return: The number of values iterated over.
+        """
+        return self._position
+
+    def restore(self, position):
+        """
+        :param position: The number of values to skip.
+        """
+        self._skip = position - self._position
+
+
+def read_checkpoint(path):
+    """
+    :param path: The path of a checkpoint file.
+    :return: A tuple of the position and the spigot saved in path,
+     or None if there is no checkpoint.
+    """
+    try:
+        with open(path, 'rb') as checkpoint_file:
+            return pickle.load(checkpoint_file)
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+
+
+def write_checkpoint(path, position, spigot):
+    """
+    Save position and spigot to path, replacing any checkpoint
+    there only once it is completely written.
+
+    :param path: The path of the checkpoint file.
+    :param position: The position of a checkpointable iterator.
+    :param spigot: A picklable bucket.
+    """
+    partial_path = path + '.partial'
+    with open(partial_path, 'wb') as checkpoint_file:
+        pickle.dump((position, spigot), checkpoint_file,
+                    pickle.HIGHEST_PROTOCOL)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.rename(partial_path, path)
+
+
+def remove_checkpoint(path):
+    """
+    :param path: The path of a checkpoint file, which may not exist.
+    """
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def i_checkpointed(batches, checkpointable, spigot, path, interval,
+                   timer=default_timer):
+    """
+    Yield each batch, and once interval seconds have passed since the
+    last checkpoint, a Deferred which fires once the position of
+    checkpointable and spigot are written to path in a thread.
+
+    The cooperative task is paused until then, so neither changes
+    while they are being written, but the reactor is not.
+
+    :param batches: An iterator of the batches of checkpointable.
+    :param checkpointable: A checkpointable iterator.
+    :param spigot: The bucket accumulating the values of checkpointable.
+    :param path: The path of the checkpoint file.
+    :param interval: Seconds between checkpoints.
+    :param timer: Function returning the current time in seconds.
+    """
+    last_checkpoint = timer()
+    for batch in batches:
+        yield batch
+        if timer() - last_checkpoint >= interval:
+            yield deferToThread(write_checkpoint, path,
+                                checkpointable.position(), spigot)
+            last_checkpoint = timer()
+
+
+def resumable_batch_accumulate(max_batch_size, checkpointable, path,
+                               interval=60.0, cooperator=None,
+                               spigot=None, timer=default_timer):
+    """
+    Start a Deferred whose callBack arg is the accumulation of the
+    values yielded from checkpointable, which is iterated over in
+    batches the size of max_batch_size, like batch_accumulate.
+
+    Every interval seconds, the position of checkpointable and the
+    spigot are saved to path. If path has a checkpoint when this is
+    called, checkpointable is restored to its position and the values
+    are accumulated in its spigot, instead of starting over.
+
+    The checkpoint is read, written and removed, once the accumulation
+    is done, in threads.
+
+    :param max_batch_size: The number of iterations of the generator
+     to consume at a time.
+    :param checkpointable: A checkpointable iterator which yields some
+     not None values, such as a Replayable.
+    :param path: The path of the checkpoint file.
+    :param interval: Seconds between checkpoints.
+    :param cooperator: A Cooperator, default_cooperator if it is None.
+    :param spigot: Optional picklable bucket to accumulate in, such as
+     a ValueBucket, ArrayBucket or ReduceBucket for a running fold,
+     a ValueBucket if it is None.
+    :param timer: Function returning the current time in seconds.
+    :return: A Deferred to which the next callback will be called with
+     the drained contents of the spigot.
+    """
+    def start(checkpoint):
+        own_spigot = spigot if spigot is not None else ValueBucket()
+        if checkpoint is not None:
+            position, own_spigot = checkpoint
+            checkpointable.restore(position)
+
+        own_cooperate = _cooperate_with(cooperator)
+        a_generator, own_cooperate = instrument(checkpointable,
+                                                own_cooperate)
+        items = stream_tap((own_spigot,), a_generator)
+        batches = i_checkpointed(i_batch(max_batch_size, items),
+                                 checkpointable, own_spigot, path,
+                                 interval, timer)
+        return when_done(own_cooperate(batches), own_spigot)
+
+    def finish(result):
+        d = deferToThread(remove_checkpoint, path)
+        d.addCallback(lambda _: result)
+        return d
+
+    d = deferToThread(read_checkpoint, path)
+    d.addCallback(start)
+    d.addCallback(finish)
+    return d
@@ -0,0 +1,236 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_metrics -*-
+"""
+Opt-in instrumentation of the cooperative tasks started by
+accumulate, batch_accumulate and the like.
+
+Enable it with registry.enable(), then export registry.snapshot()
+to a metrics pipeline. While disabled, the only cost is checking
+registry.enabled when a task starts.
+"""
+from collections import deque
+from itertools import count
+from timeit import default_timer
+
+try:
+    from time import process_time as cpu_timer
+except ImportError:
+    from time import clock as cpu_timer
+
+# Upper bounds, in seconds, of the slice duration histogram buckets.
+SLICE_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                0.01, 0.025, 0.05, 0.1, float('inf'))
+
+
+class TaskMetrics(object):
+    """
+    Measurements of one cooperative task.
+
+    A slice is one iteration of the task by its Cooperator, during
+    which the reactor is held, such as consuming one batch.
+    """
+    def __init__(self, task_id, name, timer=default_timer):
+        self.task_id = task_id
+        self.name = name
+        self.created = timer()
+        self.started = None
+        self.finished = None
+        self.items = 0
+        self.slices = 0
+        self.busy_time = 0.0
+        self.cpu_time = 0.0
+        self.max_slice = 0.0
+        self.slice_histogram = [0] * len(SLICE_BOUNDS)
+
+    def record_slice(self, started, duration, cpu_duration):
+        """
+        :param started: When the slice started.
+        :param duration: Seconds the slice took.
+        :param cpu_duration: Seconds of cpu time the slice took.
+        """
+        if self.started is None:
+            self.started = started
+        self.slices += 1
+        self.busy_time += duration
+        self.cpu_time += cpu_duration
+        self.max_slice = max(self.max_slice, duration)
+        for index, bound in enumerate(SLICE_BOUNDS):
+            if duration <= bound:
+                self.slice_histogram[index] += 1
+                break
+
+    def i_count(self, iterable):
+        """
+        Pass through the items of iterable, counting them.
+
+        :param iterable: An iterable
+        """
+        for item in iterable:
+            self.items += 1
+            yield item
+
+    def snapshot(self, now):
+        """
+        :param now: The current time.
+        :return: A dict of the measurements.
+        """
+        end = now if self.finished is None else self.finished
+        return {
+            'task_id': self.task_id,
+            'name': self.name,
+            'done': self.finished is not None,
+            'items': self.items,
+            'slices': self.slices,
+            'wall_time': end - self.created,
+            'busy_time': self.busy_time,
+            'cpu_time': self.cpu_time,
+            'queue_wait': (end if self.started is None
+                           else self.started) - self.created,
+            'max_slice': self.max_slice,
+            'items_per_second': (self.items / self.busy_time
+                                 if self.busy_time else 0.0),
+            'slice_histogram': dict(
+                (repr(bound), number)
+                for bound, number in zip(SLICE_BOUNDS,
+                                         self.slice_histogram)),
+        }
+
+
+class MetricsRegistry(object):
+    """
+    Keeps the TaskMetrics of running tasks, and of the most recently
+    finished ones, once enabled.
+    """
+    def __init__(self, keep_finished=100, timer=default_timer):
+        """
+        :param keep_finished: How many finished tasks to keep.
+        :param timer: Function returning the current time in seconds.
+        """
+        self.enabled = False
+        self._timer = timer
+        self._ids = count(1)
+        self._running = {}
+        self._finished = deque(maxlen=keep_finished)
+        self._finished_count = 0
+        self._slice_observers = []
+
+    def enable(self):
+        """
+        Measure tasks started from now on.
+        """
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop measuring tasks started from now on.
+        """
+        self.enabled = False
+
+    def clear(self):
+        """
+        Forget all tasks measured so far.
+        """
+        self._running.clear()
+        self._finished.clear()
+        self._finished_count = 0
+
+    def add_slice_observer(self, observer):
+        """
+        :param observer: A callable to call with the TaskMetrics and
+         duration of each slice measured from now on.
+        """
+        self._slice_observers.append(observer)
+
+    def remove_slice_observer(self, observer):
+        """
+        :param observer: A callable added with add_slice_observer.
+        """
+        self._slice_observers.remove(observer)
+
+    def i_instrumented(self, task_metrics, iterator):
+        """
+        Generator that passes through the results of iterator,
+        recording each iteration as a slice of task_metrics.
+
+        :param task_metrics: TaskMetrics
+        :param iterator: The iterator of a cooperative task.
+        """
+        timer = self._timer
+        iterator = iter(iterator)
+        while True:
+            started = timer()
+            cpu_started = cpu_timer()
+            try:
+                result = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                duration = timer() - started
+                task_metrics.record_slice(started, duration,
+                                          cpu_timer() - cpu_started)
+                for observer in self._slice_observers:
+                    observer(task_metrics, duration)
+            yield result
+
+    def _finish(self, task_metrics):
+        """
+        Move task_metrics from the running to the finished tasks.
+
+        :param task_metrics: TaskMetrics
+        """
+        task_metrics.finished = self._timer()
+        self._running.pop(task_metrics.task_id, None)
+        self._finished.append(task_metrics)
+        self._finished_count += 1
+
+    def instrument(self, a_generator, own_cooperate):
+        """
+        Measure the task own_cooperate starts for a_generator,
+        if enabled.
+
+        :param a_generator: The iterator of values of the task.
+        :param own_cooperate: A cooperate function.
+        :return: a tuple of a_generator and own_cooperate, wrapped
+         to be measured when enabled.
+        """
+        if not self.enabled:
+            return a_generator, own_cooperate
+
+        name = getattr(a_generator, '__name__', type(a_generator).__name__)
+        task_metrics = TaskMetrics(next(self._ids), name, self._timer)
+        self._running[task_metrics.task_id] = task_metrics
+
+        def instrumented_cooperate(iterator):
+            task = own_cooperate(self.i_instrumented(task_metrics, iterator))
+            task.whenDone().addBoth(lambda _: self._finish(task_metrics))
+            return task
+
+        return task_metrics.i_count(a_generator), instrumented_cooperate
+
+    def snapshot(self):
+        """
+        :return: A dict of the number of running and finished tasks,
+         and the measurements of the running and recently finished ones.
+        """
+        now = self._timer()
+        return {
+            'running': len(self._running),
+            'finished': self._finished_count,
+            'tasks': [task_metrics.snapshot(now) for task_metrics in
+                      sorted(self._running.values(),
+                             key=lambda task_metrics: task_metrics.task_id)
+                      + list(self._finished)],
+        }
+
+
+registry = MetricsRegistry()
+
+
+def instrument(a_generator, own_cooperate):
+    """
+    Measure the task own_cooperate starts for a_generator in
+    registry, if it is enabled.
+
+    :return: a tuple of a_generator and own_cooperate.
+    """
+    return registry.instrument(a_generator, own_cooperate)
@@ -0,0 +1,157 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_parse -*-
+"""
+Parse large files of records, such as CSV or JSON lines, in the
+reactor process, reading and parsing them a batch of records at a
+time, so both count toward the time each cooperative slice takes.
+"""
+import csv
+import json
+import mmap
+import os
+
+from cooperative import batch_accumulate
+from cooperative import batch_stream
+
+
+def i_lines(path, use_mmap=True, buffer_size=1 << 20):
+    """
+    Generator that reads the lines of the file at path as they are
+    iterated over, each as bytes ending with its newline, if it has one.
+
+    With use_mmap, the file is mapped into memory and split by
+    searching the mapping for each newline, which only copies each
+    line out of it once, or else it is read through a buffer of
+    buffer_size bytes.
+
+    :param path: The path of a file.
+    :param use_mmap: When True, read the file through mmap.
+    :param buffer_size: Bytes to read at a time without mmap.
+    """
+    with open(path, 'rb', buffer_size) as lines_file:
+        if not use_mmap:
+            for line in lines_file:
+                yield line
+            return
+        size = os.fstat(lines_file.fileno()).st_size
+        if not size:
+            return
+
+        mapped = mmap.mmap(lines_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            while start < size:
+                end = mapped.find(b'\n', start)
+                end = size if end == -1 else end + 1
+                yield mapped[start:end]
+                start = end
+        finally:
+            mapped.close()
+
+
+def i_parsed(parse, lines):
+    """
+    Generator that yields parse of each line of lines.
+
+    :param parse: A function of a line which returns a value,
+     or None to skip it.
+    :param lines: An iterable of lines.
+    """
+    for line in lines:
+        yield parse(line)
+
+
+def parse_lines(path, parse, max_batch_size=1000, use_mmap=True,
+                sink=None, spigot=None, cooperator=None):
+    """
+    Start a Deferred whose callBack arg is the accumulation of parse
+    of each line of the file at path, like batch_accumulate, which
+    is given the lines read in batches the size of max_batch_size.
+
+    Given a sink, it is called with a deque of each batch of the
+    values instead, like batch_stream, and the Deferred
+    fires with None.
+
+    :param path: The path of a file.
+    :param parse: A function of a line, as bytes, which returns
+     a value, or None to skip it.
+    :param max_batch_size: The number of lines to read and parse
+     at a time.
+    :param use_mmap: When True, read the file through mmap.
+    :param sink: Optional callable taking a deque of values, which
+     may return a Deferred.
+    :param spigot: Optional bucket to accumulate in, without a sink.
+    :param cooperator: A Cooperator, default_cooperator if it is None.
+    :return: A Deferred to which the next callback will be called with
+     the parsed values, or None given a sink.
+    """
+    values = i_parsed(parse, i_lines(path, use_mmap))
+    if sink is not None:
+        return batch_stream(max_batch_size, values, sink, cooperator)
+    return batch_accumulate(max_batch_size, values, cooperator,
+                            spigot=spigot)
+
+
+def parse_json_line(line):
+    """
+    :param line: A line of JSON, as bytes.
+    :return: The value of line, or None if it is blank.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def json_lines(path, **kwargs):
+    """
+    Start a Deferred whose callBack arg is a deque of the value of
+    each line of the JSON lines file at path, skipping blank lines.
+
+    :param path: The path of a file.
+    :param kwargs: Keyword arguments of parse_lines, other than parse.
+    :return: A Deferred to which the next callback will be called with
+     the values, or None given a sink.
+    """
+    return parse_lines(path, parse_json_line, **kwargs)
+
+
+def csv_rows(path, dict_rows=False, encoding='utf-8', max_batch_size=1000,
+             use_mmap=True, sink=None, spigot=None, cooperator=None,
+             **fmtparams):
+    """
+    Start a Deferred whose callBack arg is a deque of each row of the
+    CSV file at path, as a list, or given dict_rows, as a dict keyed
+    by the fields of the first row, like csv.reader and csv.DictReader.
+
+    A quoted field may span lines, in which case its row is parsed
+    once all of them are read.
+
+    :param path: The path of a file.
+    :param dict_rows: When True, each row is a dict.
+    :param encoding: The encoding of the file, which the csv module
+     decodes on Python 3, but is given bytes on Python 2.
+    :param max_batch_size: The number of rows to read and parse
+     at a time.
+    :param use_mmap: When True, read the file through mmap.
+    :param sink: Optional callable taking a deque of rows, which
+     may return a Deferred.
+    :param spigot: Optional bucket to accumulate in, without a sink.
+    :param cooperator: A Cooperator, default_cooperator if it is None.
+    :param fmtparams: Formatting parameters of csv.reader,
+     such as delimiter.
+    :return: A Deferred to which the next callback will be called with
+     the rows, or None given a sink.
+    """
+    lines = i_lines(path, use_mmap)
+    if str is not bytes:
+        lines = (line.decode(encoding) for line in lines)
+    if dict_rows:
+        rows = csv.DictReader(lines, **fmtparams)
+    else:
+        rows = csv.reader(lines, **fmtparams)
+
+    if sink is not None:
+        return batch_stream(max_batch_size, rows, sink, cooperator)
+    return batch_accumulate(max_batch_size, rows, cooperator,
+                            spigot=spigot)
@@ -0,0 +1,175 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_probe -*-
+"""
+Measure whether the reactor stays responsive while cooperative tasks
+run, by how late a frequent heartbeat fires, and find the tasks whose
+slices made it late.
+"""
+from collections import deque
+from math import floor
+from math import log10
+
+from cooperative.metrics import registry
+
+
+class LagHistogram(object):
+    """
+    A histogram of durations which, like an HDR histogram, keeps each
+    one to a fixed number of significant figures, so any percentile
+    is within that relative precision while the number of buckets
+    only grows with the logarithm of the range recorded.
+    """
+    def __init__(self, significant_figures=2, unit=1e-6):
+        """
+        :param significant_figures: Precision each duration is kept to.
+        :param unit: The smallest duration told apart, in seconds.
+        """
+        self._significant_figures = significant_figures
+        self._unit = unit
+        self._counts = {}
+        self.count = 0
+        self.max = 0.0
+
+    def _bucket(self, units):
+        """
+        :param units: A whole number of units.
+        :return: units rounded down to the significant figures.
+        """
+        if units < 10 ** self._significant_figures:
+            return units
+        scale = 10 ** (int(floor(log10(units))) + 1 -
+                       self._significant_figures)
+        return units // scale * scale
+
+    def record(self, duration):
+        """
+        :param duration: Seconds.
+        """
+        bucket = self._bucket(int(max(duration, 0.0) / self._unit))
+        self._counts[bucket] = self._counts.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, duration)
+
+    def percentile(self, fraction):
+        """
+        :param fraction: Between 0 and 1, such as 0.99.
+        :return: Seconds which fraction of the durations recorded
+         are at most, to the significant figures.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(fraction * self.count)))
+        seen = 0
+        for bucket in sorted(self._counts):
+            seen += self._counts[bucket]
+            if seen >= rank:
+                return bucket * self._unit
+        return self.max
+
+    def snapshot(self):
+        """
+        :return: A dict of the count, common percentiles and max.
+        """
+        return {
+            'count': self.count,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'p999': self.percentile(0.999),
+            'max': self.max,
+        }
+
+
+class ResponsivenessProbe(object):
+    """
+    Schedules a heartbeat every interval seconds and records how late
+    each one fires in a LagHistogram.
+
+    While the metrics registry is enabled, a heartbeat later than
+    spike_threshold is kept as a spike, along with the longest slice
+    of a cooperative task since the previous heartbeat, which is the
+    most likely cause.
+    """
+    def __init__(self, interval=0.005, spike_threshold=0.05, clock=None,
+                 metrics_registry=registry, keep_spikes=100):
+        """
+        :param interval: Seconds between heartbeats.
+        :param spike_threshold: Seconds late a heartbeat must be
+         to be kept as a spike.
+        :param clock: The IReactorTime to schedule heartbeats with,
+         the reactor if it is None.
+        :param metrics_registry: The MetricsRegistry whose slices
+         to watch.
+        :param keep_spikes: How many of the latest spikes to keep.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.interval = interval
+        self.spike_threshold = spike_threshold
+        self.histogram = LagHistogram()
+        self.spikes = deque(maxlen=keep_spikes)
+        self.spikes_by_task = {}
+        self._clock = clock
+        self._metrics_registry = metrics_registry
+        self._call = None
+        self._scheduled = None
+        self._longest_slice = None
+
+    def start(self):
+        """
+        Start the heartbeat.
+        """
+        self._metrics_registry.add_slice_observer(self.observe_slice)
+        self._schedule()
+
+    def stop(self):
+        """
+        Stop the heartbeat.
+        """
+        self._metrics_registry.remove_slice_observer(self.observe_slice)
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+    def _schedule(self):
+        self._scheduled = self._clock.seconds() + self.interval
+        self._longest_slice = None
+        self._call = self._clock.callLater(self.interval, self._heartbeat)
+
+    def observe_slice(self, task_metrics, duration):
+        """
+        Keep the longest slice since the last heartbeat.
+
+        :param task_metrics: The TaskMetrics of the task of the slice.
+        :param duration: Seconds the slice took.
+        """
+        if (self._longest_slice is None or
+                duration > self._longest_slice[1]):
+            self._longest_slice = (task_metrics, duration)
+
+    def _heartbeat(self):
+        lag = max(0.0, self._clock.seconds() - self._scheduled)
+        self.histogram.record(lag)
+        if lag >= self.spike_threshold:
+            spike = {'at': self._scheduled, 'lag': lag,
+                     'task_id': None, 'task': None, 'slice': None}
+            if self._longest_slice is not None:
+                task_metrics, duration = self._longest_slice
+                spike.update(task_id=task_metrics.task_id,
+                             task=task_metrics.name, slice=duration)
+                self.spikes_by_task[task_metrics.name] = (
+                    self.spikes_by_task.get(task_metrics.name, 0) + 1)
+            self.spikes.append(spike)
+        self._schedule()
+
+    def snapshot(self):
+        """
+        :return: A dict of the lag histogram summary, the latest spikes
+         and the number of spikes by task name.
+        """
+        return {
+            'interval': self.interval,
+            'lag': self.histogram.snapshot(),
+            'spikes': list(self.spikes),
+            'spikes_by_task': dict(self.spikes_by_task),
+        }
@@ -0,0 +1,318 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_process -*-
+"""
+Run generators in a pool of worker processes, so CPU bound work
+uses more than one core, while the reactor only cooperatively
+merges the results.
+"""
+import pickle
+from functools import reduce
+from multiprocessing import Pool
+
+from twisted.internet.defer import Deferred
+from twisted.internet.defer import DeferredList
+from twisted.internet.defer import TimeoutError
+from twisted.internet.defer import fail
+from twisted.internet.task import LoopingCall
+
+from cooperative import batch_accumulate
+from cooperative import batch_reduce
+
+
+_default_pool = []
+
+# Pool.apply_async only takes an error_callback on Python 3.
+_has_error_callback = str is not bytes
+
+
+class WorkerLost(Exception):
+    """
+    A worker process of the pool died while a job was outstanding,
+    so its result may never come.
+    """
+
+
+def default_pool():
+    """
+    :return: A multiprocessing Pool shared by calls which are not
+     given one, with a worker process for each cpu, created
+     the first time it is needed.
+    """
+    if not _default_pool:
+        _default_pool.append(Pool())
+    return _default_pool[0]
+
+
+def run_generator(generator_factory, args):
+    """
+    Iterate over the generator made by calling generator_factory
+    with args, within a worker process.
+
+    :param generator_factory: A function, which can be pickled,
+     returning an iterator which yields some not None values.
+    :param args: A tuple of arguments for generator_factory.
+    :return: A list of the non-None values yielded.
+    """
+    return [value for value in generator_factory(*args)
+            if value is not None]
+
+
+def run_reduce(generator_factory, args, fn, initial):
+    """
+    Fold the non-None values of the generator made by calling
+    generator_factory with args into initial with fn,
+    within a worker process.
+
+    :param generator_factory: A function, which can be pickled,
+     returning an iterator which yields some not None values.
+    :param args: A tuple of arguments for generator_factory.
+    :param fn: A function, which can be pickled, of two arguments,
+     the accumulator and a value, which returns the new accumulator.
+    :param initial: The starting value of the accumulator.
+    :return: The final accumulator.
+    """
+    return reduce(fn, (value for value in generator_factory(*args)
+                       if value is not None), initial)
+
+
+def run_returning_errors(function, args):
+    """
+    Call function with args, within a worker process, returning
+    any error it raises instead, or that of pickling its result,
+    since a Pool on Python 2 has no error_callback, and would never
+    send back a result which can not be pickled.
+
+    :param function: A function, which can be pickled.
+    :param args: A tuple of arguments for function.
+    :return: A tuple of True and the result, or of False and the error.
+    """
+    try:
+        outcome = True, function(*args)
+    except Exception as error:
+        outcome = False, error
+    try:
+        pickle.dumps(outcome, pickle.HIGHEST_PROTOCOL)
+    except Exception as error:
+        return False, pickle.PicklingError(
+            "Can not send back %r: %s" % (outcome[1], error))
+    return outcome
+
+
+def _apply(pool, function, args, timeout=None, poll_interval=1.0):
+    """
+    :return: A Deferred whose callBack arg is the result of calling
+     function with args in a worker process of pool, which is called
+     back from the result thread of pool, without holding one of
+     the threads of the reactor, and which fails with TimeoutError
+     if it takes longer than timeout, or with WorkerLost if a worker
+     process of pool dies before it is done, checked every
+     poll_interval seconds, or with a PicklingError if function,
+     args or the result can not be pickled.
+
+    Which worker process runs the job is not known, so the death of
+    any of them, found through the private _pool of pool, fails
+    every job outstanding at the time.
+    """
+    from twisted.internet import reactor
+    if not _has_error_callback:
+        # Python 2 drops a job which can not be pickled without a word.
+        try:
+            pickle.dumps((function, args), pickle.HIGHEST_PROTOCOL)
+        except Exception as error:
+            return fail(pickle.PicklingError(
+                "Can not send %r: %s" % (function, error)))
+
+    d = Deferred()
+    workers = [worker for worker in getattr(pool, '_pool', ())
+               if worker.exitcode is None]
+
+    def fire(outcome):
+        if d.called:
+            return
+        succeeded, result = outcome
+        if succeeded:
+            d.callback(result)
+        else:
+            d.errback(result)
+
+    callbacks = {'callback': lambda outcome: reactor.callFromThread(
+        fire, outcome)}
+    if _has_error_callback:
+        callbacks['error_callback'] = lambda error: reactor.callFromThread(
+            fire, (False, pickle.PicklingError(
+                "Can not send %r: %s" % (function, error))))
+    pool.apply_async(run_returning_errors, (function, args), **callbacks)
+
+    delayed_calls = []
+    if timeout is not None:
+        def time_out():
+            if not d.called:
+                d.errback(TimeoutError(timeout))
+
+        delayed_calls.append(reactor.callLater(timeout, time_out))
+
+    watch = None
+    if poll_interval is not None and workers:
+        def check_workers():
+            if d.called:
+                return
+            lost = [worker.pid for worker in workers
+                    if worker.exitcode not in (None, 0)]
+            if lost:
+                d.errback(WorkerLost(lost))
+
+        watch = LoopingCall(check_workers)
+        watch.start(poll_interval, now=False)
+
+    def stop_watching(result):
+        for delayed_call in delayed_calls:
+            if delayed_call.active():
+                delayed_call.cancel()
+        if watch is not None and watch.running:
+            watch.stop()
+        return result
+
+    d.addBoth(stop_watching)
+    return d
+
+
+def shard_range(start, stop, shards):
+    """
+    Split the numbers from start up to stop into contiguous shards.
+
+    :param start: The first number.
+    :param stop: The number after the last.
+    :param shards: How many shards to split them into.
+    :return: A list of a tuple of the start and stop of each shard,
+     which differ in size by at most one.
+    """
+    size, extra = divmod(max(stop - start, 0), shards)
+    bounds = []
+    for index in range(shards):
+        end = start + size + (1 if index < extra else 0)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def _run_shard(pool, generator_factory, args, fn, initial, retries,
+               timeout, poll_interval):
+    """
+    :return: A Deferred whose callBack arg is the result of run_reduce
+     in a worker process of pool, which is run again, up to retries
+     more times, if it fails, takes longer than timeout, or a worker
+     process dies, but not if it can not be pickled.
+    """
+    def retry(failure, remaining):
+        if failure.check(pickle.PicklingError):
+            return failure
+        return attempt(remaining - 1)
+
+    def attempt(remaining):
+        d = _apply(pool, run_reduce, (generator_factory, args, fn, initial),
+                   timeout, poll_interval)
+        if remaining:
+            d.addErrback(retry, remaining)
+        return d
+    return attempt(retries)
+
+
+def sharded_reduce(generator_factory, shards, fn, initial, merge=None,
+                   pool=None, retries=1, timeout=None, max_batch_size=1000,
+                   cooperator=None, poll_interval=1.0):
+    """
+    Start a Deferred whose callBack arg is the result of folding the
+    values of all of the shards into initial, where a shard is the
+    generator made by calling generator_factory with one tuple of
+    arguments in shards.
+
+    Each shard is folded with fn in a worker process of pool, so
+    they run in parallel on as many cores as pool has processes,
+    then the result of each is merged, in the order of shards,
+    cooperatively on the reactor with merge.
+
+    A shard which fails, or takes longer than timeout, is run again,
+    up to retries times. When a worker process of pool dies, every
+    shard outstanding at the time is run again, including those
+    running in the other worker processes, since which one was lost
+    is not known. A shard whose arguments, functions or result can
+    not be pickled fails with a PicklingError without being run
+    again. The Deferred fails with the failure of the first shard
+    which runs out of retries, once every shard is done.
+
+    :param generator_factory: A function, which can be pickled,
+     such as one defined at the top level of a module, returning
+     an iterator which yields some not None values.
+    :param shards: A list of a tuple of arguments, which can be
+     pickled, for each shard, such as from shard_range.
+    :param fn: A function, which can be pickled, of two arguments,
+     the accumulator and a value, which returns the new accumulator.
+    :param initial: The starting value of the accumulator, of every
+     shard and of the merge, so an identity of fn, such as 0 for add.
+    :param merge: A function of two accumulators which returns their
+     combination, fn if it is None.
+    :param pool: A multiprocessing Pool, or None to use default_pool.
+    :param retries: How many times to run a failed shard again.
+    :param timeout: Optional seconds to wait for each run of a shard.
+    :param max_batch_size: The number of results to merge at a time.
+    :param poll_interval: Seconds between checks for worker processes
+     which died, or None not to check.
+    :return: A Deferred to which the next callback will be called with
+     the final accumulator.
+    """
+    if pool is None:
+        pool = default_pool()
+    if merge is None:
+        merge = fn
+
+    def merge_results(results):
+        for success, result in results:
+            if not success:
+                return result
+        return batch_reduce(merge, initial, max_batch_size,
+                            (result for success, result in results),
+                            cooperator)
+
+    d = DeferredList([_run_shard(pool, generator_factory, args, fn,
+                                 initial, retries, timeout, poll_interval)
+                      for args in shards], consumeErrors=True)
+    d.addCallback(merge_results)
+    return d
+
+
+def process_accumulate(generator_factory, args=(), pool=None,
+                       max_batch_size=1000, cooperator=None,
+                       poll_interval=1.0):
+    """
+    Start a Deferred whose callBack arg is a deque of the accumulation
+    of the values yielded from the generator made by calling
+    generator_factory with args, which is iterated over
+    in a worker process of pool.
+
+    The values are merged into the deque cooperatively, in batches
+     the size of max_batch_size, so a large result does not block
+     the reactor either.
+
+    The Deferred fails with WorkerLost if a worker process of pool
+     dies before the generator is done.
+
+    :param generator_factory: A function, which can be pickled,
+     such as one defined at the top level of a module, returning
+     an iterator which yields some not None values.
+    :param args: A tuple of arguments, which can be pickled,
+     for generator_factory.
+    :param pool: A multiprocessing Pool, or None to use default_pool.
+    :param max_batch_size: The number of values to merge at a time.
+    :param poll_interval: Seconds between checks for worker processes
+     which died, or None not to check.
+    :return: A Deferred to which the next callback will be called with
+     the yielded contents of the generator function.
+    """
+    if pool is None:
+        pool = default_pool()
+
+    d = _apply(pool, run_generator, (generator_factory, args),
+               poll_interval=poll_interval)
+    d.addCallback(lambda values: batch_accumulate(
+        max_batch_size, iter(values), cooperator))
+    return d
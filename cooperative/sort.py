@@ -0,0 +1,157 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_sort -*-
+"""
+Sort more values than can be sorted in one call without blocking the
+reactor, by sorting runs of them a slice at a time, optionally
+spilling each run to a temporary file, then merging the runs.
+"""
+import heapq
+from itertools import islice
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+from cooperative import batch_stream
+from cooperative.spill import SpillBucket
+
+
+class _Reversed(object):
+    """
+    Compares in the opposite order to the key it wraps.
+    """
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def i_sorted_runs(iterable, run_size, key=None, reverse=False,
+                  max_batch_size=1000, spill=False, directory=None):
+    """
+    Generator that reads the non-None values of iterable in batches
+    of max_batch_size, yielding None after each, and yields each run
+    of about run_size of them once it is sorted.
+
+    :param iterable: An iterable of values.
+    :param run_size: Least number of values in each run, except the
+     last, which bounds how long sorting one takes.
+    :param key: Optional function of a value to sort by.
+    :param reverse: When True, sort largest first.
+    :param max_batch_size: The number of values to read at a time,
+     and to spill at a time.
+    :param spill: When True, each run is a SpilledContents of a
+     temporary file instead of a list.
+    :param directory: Optional directory for the temporary files.
+    """
+    iterator = iter(iterable)
+    run = []
+    while True:
+        batch = tuple(islice(iterator, max_batch_size))
+        run.extend(value for value in batch if value is not None)
+        if batch and len(run) < run_size:
+            yield None
+            continue
+
+        if run:
+            run.sort(key=key, reverse=reverse)
+            if spill:
+                bucket = SpillBucket(max_batch_size, directory=directory)
+                for start in range(0, len(run), max_batch_size):
+                    bucket.extend(run[start:start + max_batch_size])
+                run = bucket.drain_contents()
+            yield run
+            run = []
+        if not batch:
+            return
+
+
+def i_merge(runs, key=None, reverse=False):
+    """
+    Generator that merges sorted runs, like heapq.merge, keeping the
+    values of equal keys in the order of their runs, so merging the
+    sorted runs of an iterable gives a stable sort of it.
+
+    :param runs: A sequence of iterables sorted by key.
+    :param key: Optional function of a value the runs are sorted by.
+    :param reverse: When True, the runs are sorted largest first.
+    """
+    def sort_key(value):
+        value_key = value if key is None else key(value)
+        return _Reversed(value_key) if reverse else value_key
+
+    heap = []
+    for index, run in enumerate(runs):
+        iterator = iter(run)
+        for value in iterator:
+            heap.append([sort_key(value), index, value, iterator])
+            break
+    heapq.heapify(heap)
+
+    while heap:
+        entry = heap[0]
+        yield entry[2]
+        for value in entry[3]:
+            entry[0] = sort_key(value)
+            entry[2] = value
+            heapq.heapreplace(heap, entry)
+            break
+        else:
+            heapq.heappop(heap)
+
+
+def cooperative_sort(iterable, key=None, reverse=False, run_size=10000,
+                     max_batch_size=1000, spill=False, directory=None,
+                     sink=None, cooperator=None):
+    """
+    Start a Deferred whose callBack arg is a deque of the non-None
+    values of iterable, stably sorted like sorted.
+
+    Runs of run_size values are each sorted in one step of a
+    cooperative task, then merged in batches of max_batch_size,
+    so no single call takes longer than sorting one run.
+
+    Given a sink, it is called with a deque of each batch of the
+    merged values instead, like batch_stream, and the Deferred
+    fires with None.
+
+    :param iterable: An iterable of values.
+    :param key: Optional function of a value to sort by.
+    :param reverse: When True, sort largest first.
+    :param run_size: The number of values to sort at a time.
+    :param max_batch_size: The number of values to read, spill and
+     merge at a time.
+    :param spill: When True, each sorted run is written to a temporary
+     file, so at most max_batch_size values of each are in memory
+     while they are merged.
+    :param directory: Optional directory for the temporary files.
+    :param sink: Optional callable taking a deque of values, which
+     may return a Deferred.
+    :param cooperator: A Cooperator, default_cooperator if it is None.
+    :return: A Deferred to which the next callback will be called with
+     the sorted values, or None given a sink.
+    """
+    def merge(runs):
+        merged = i_merge(runs, key, reverse)
+        if sink is None:
+            d = batch_accumulate(max_batch_size, merged, cooperator)
+        else:
+            d = batch_stream(max_batch_size, merged, sink, cooperator)
+        d.addBoth(close, runs)
+        return d
+
+    def close(result, runs):
+        if spill:
+            for run in runs:
+                run.close()
+        return result
+
+    d = accumulate(i_sorted_runs(iterable, run_size, key, reverse,
+                                 max_batch_size, spill, directory),
+                   cooperator)
+    d.addCallback(merge)
+    return d
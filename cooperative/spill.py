@@ -0,0 +1,190 @@
+# _*_ coding: utf-8 _*_
+# -*- test-case-name: cooperative.tests.test_spill -*-
+"""
+Accumulate more values than should be kept in memory, by spilling
+them to a temporary file, to be read back lazily.
+"""
+import mmap
+import pickle
+import tempfile
+from array import array
+
+
+class SpilledContents(object):
+    """
+    A lazy view of the values accumulated by a SpillBucket, which are
+    read back from its temporary file as they are iterated over,
+    followed by those still in memory.
+
+    It may be iterated over any number of times, until it is closed.
+    """
+    def __init__(self, spill_file, offsets, spilled, memory, typecode,
+                 read_size=1024):
+        """
+        :param spill_file: The temporary file, or None.
+        :param offsets: The offsets in spill_file of each pickled batch.
+        :param spilled: The number of values in spill_file.
+        :param memory: A list of the values not spilled.
+        :param typecode: The array typecode of the values in spill_file,
+         or None if they are pickled.
+        :param read_size: How many values of typecode to read at a time.
+        """
+        self._spill_file = spill_file
+        self._offsets = offsets
+        self._spilled = spilled
+        self._memory = memory
+        self._typecode = typecode
+        self._read_size = read_size
+
+    def __len__(self):
+        return self._spilled + len(self._memory)
+
+    def __iter__(self):
+        if self._spill_file is not None:
+            if self._typecode is None:
+                spilled = self._i_pickled()
+            else:
+                spilled = self._i_array()
+            for value in spilled:
+                yield value
+        for value in self._memory:
+            yield value
+
+    def _i_pickled(self):
+        for offset in self._offsets:
+            self._spill_file.seek(offset)
+            for value in pickle.load(self._spill_file):
+                yield value
+
+    def _i_array(self):
+        itemsize = array(self._typecode).itemsize
+        for start in range(0, self._spilled, self._read_size):
+            values = array(self._typecode)
+            self._spill_file.seek(start * itemsize)
+            values.fromfile(self._spill_file,
+                            min(self._read_size, self._spilled - start))
+            for value in values:
+                yield value
+
+    def mapped(self):
+        """
+        Map the spilled values into memory, such as for
+        numpy.frombuffer(contents.mapped(), typecode).
+
+        Only for a SpillBucket with a typecode, whose values are all
+        spilled once drained.
+
+        :return: A read only mmap.mmap of the values as raw
+         values of typecode.
+        """
+        if self._typecode is None:
+            raise TypeError("Only values of a typecode can be mapped.")
+        if self._memory:
+            raise ValueError("Not all of the values are spilled.")
+        if self._spill_file is None:
+            raise ValueError("There are no spilled values to map.")
+        self._spill_file.flush()
+        return mmap.mmap(self._spill_file.fileno(), 0,
+                         access=mmap.ACCESS_READ)
+
+    def close(self):
+        """
+        Close and remove the temporary file.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._offsets = []
+        self._spilled = 0
+        self._memory = []
+
+
+class SpillBucket(object):
+    """
+    Produces a callable that accumulates all non-None values
+    it is called with in order, like a ValueBucket, but once
+    max_in_memory of them are held, writes them to a temporary file.
+
+    Values are pickled, a batch at a time, unless a typecode is given,
+    in which case they are written as a raw array.array of typecode.
+
+    The contents are a SpilledContents view of the values.
+    """
+    def __init__(self, max_in_memory=10000, typecode=None, directory=None):
+        """
+        :param max_in_memory: How many values to hold before
+         spilling them.
+        :param typecode: Optional array typecode of the values.
+        :param directory: Optional directory for the temporary file.
+        """
+        self._max_in_memory = max_in_memory
+        self._typecode = typecode
+        self._directory = directory
+        self._reset()
+
+    def _reset(self):
+        self._memory = []
+        self._spill_file = None
+        self._offsets = []
+        self._spilled = 0
+
+    def __call__(self, value):
+        if value is not None:
+            self._memory.append(value)
+            if len(self._memory) >= self._max_in_memory:
+                self._spill()
+
+    def extend(self, values):
+        """
+        Accumulate all of the values of a chunk, unless it is None.
+        The values themselves are not checked for None.
+
+        :param values: A sequence of values.
+        """
+        if values is not None:
+            self._memory.extend(values)
+            if len(self._memory) >= self._max_in_memory:
+                self._spill()
+
+    def _spill(self):
+        """
+        Write the values in memory to the end of the temporary file.
+        """
+        if not self._memory:
+            return
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self._directory)
+        self._spill_file.seek(0, 2)
+        if self._typecode is None:
+            self._offsets.append(self._spill_file.tell())
+            pickle.dump(self._memory, self._spill_file,
+                        pickle.HIGHEST_PROTOCOL)
+        else:
+            array(self._typecode, self._memory).tofile(self._spill_file)
+        self._spilled += len(self._memory)
+        self._memory = []
+
+    def contents(self):
+        """
+        :returns: A SpilledContents of the contents so far.
+        """
+        return SpilledContents(self._spill_file, list(self._offsets),
+                               self._spilled, list(self._memory),
+                               self._typecode)
+
+    def drain_contents(self):
+        """
+        Starts a new collection to accumulate future contents
+        and returns all of existing contents, as a SpilledContents
+        which owns the temporary file.
+
+        With a typecode, any values still in memory are spilled first,
+        once some have been, so all of them can be mapped.
+        """
+        if self._typecode is not None and self._spill_file is not None:
+            self._spill()
+        existing_contents = SpilledContents(
+            self._spill_file, self._offsets, self._spilled, self._memory,
+            self._typecode)
+        self._reset()
+        return existing_contents
@@ -0,0 +1,106 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative.admission import AdmissionController
+from cooperative.admission import QueueFull
+
+
+class TestAdmissionController(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.started = []
+        self.pending = {}
+
+    def start(self, name):
+        """
+        :return: A function which records that name started and returns
+         a Deferred fired by the test.
+        """
+        def start():
+            self.started.append(name)
+            self.pending[name] = defer.Deferred()
+            return self.pending[name]
+        return start
+
+    def test_max_active(self):
+        """
+        Ensure at most max_active calls run, and queued ones start
+        by priority, then first in first out, as running ones finish.
+
+        :return:
+        """
+        controller = AdmissionController(max_active=2,
+                                         timer=lambda: self.now)
+        results = [controller.call(self.start(name), priority)
+                   for name, priority in [('a', 0), ('b', 0), ('c', 0),
+                                          ('d', 1), ('e', 0)]]
+        self.assertEqual(self.started, ['a', 'b'])
+        self.assertEqual(controller.stats()['queued'], 3)
+
+        self.now = 0.25
+        self.pending['a'].callback('A')
+        self.assertEqual(self.successResultOf(results[0]), 'A')
+        self.assertEqual(self.started, ['a', 'b', 'd'])
+
+        self.pending['b'].errback(ValueError())
+        self.failureResultOf(results[1], ValueError)
+        self.pending['d'].callback('D')
+        self.assertEqual(self.started, ['a', 'b', 'd', 'c', 'e'])
+
+        stats = controller.stats()
+        self.assertEqual((stats['active'], stats['queued'],
+                          stats['admitted'], stats['rejected']),
+                         (2, 0, 5, 0))
+        self.assertEqual(stats['wait']['count'], 5)
+        self.assertEqual(stats['wait']['max'], 0.25)
+
+    def test_rejection(self):
+        """
+        Ensure calls past max_queued fail with QueueFull.
+
+        :return:
+        """
+        controller = AdmissionController(max_active=1, max_queued=1)
+        controller.call(self.start('a'))
+        controller.call(self.start('b'))
+        self.failureResultOf(controller.call(self.start('c')), QueueFull)
+        self.assertEqual(controller.stats()['rejected'], 1)
+
+    def test_cancel(self):
+        """
+        Ensure cancelling a queued call removes it from the queue,
+        and cancelling a running one cancels it.
+
+        :return:
+        """
+        controller = AdmissionController(max_active=1)
+        running = controller.call(self.start('a'))
+        queued = controller.call(self.start('b'))
+        controller.call(self.start('c'))
+
+        queued.cancel()
+        self.failureResultOf(queued, defer.CancelledError)
+        self.assertEqual(controller.stats()['queued'], 1)
+
+        running.cancel()
+        self.failureResultOf(running, defer.CancelledError)
+        self.assertEqual(self.started, ['a', 'c'])
+
+    @inlineCallbacks
+    def test_batch_accumulate(self):
+        """
+        Ensure batch_accumulate and accumulate run once admitted.
+
+        :return:
+        """
+        controller = AdmissionController(max_active=1)
+        result = yield defer.gatherResults([
+            controller.batch_accumulate(2, iter(range(5))),
+            controller.accumulate(iter(range(3)), typecode='l')])
+        self.assertEqual(result[0], deque(range(5)))
+        self.assertEqual(list(result[1]), list(range(3)))
+        self.assertEqual(controller.stats()['admitted'], 2)
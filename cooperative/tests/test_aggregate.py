@@ -0,0 +1,161 @@
+# _*_ coding: utf-8 _*_
+from random import Random
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+from cooperative.aggregate import HistogramBucket
+from cooperative.aggregate import QuantileBucket
+from cooperative.aggregate import ReservoirBucket
+from cooperative.aggregate import StatsBucket
+from cooperative.aggregate import TopKBucket
+
+
+class TestTopKBucket(unittest.TestCase):
+    def test_top_k(self):
+        """
+        Ensure the largest k values are kept, largest first, and of
+        equal ones the first called with.
+
+        :return:
+        """
+        bucket = TopKBucket(3, key=lambda pair: pair[0])
+        bucket((1, 'a'))
+        bucket(None)
+        bucket.extend([(5, 'b'), (3, 'c'), (5, 'd'), (4, 'e'), (2, 'f')])
+
+        self.assertEqual(bucket.drain_contents(),
+                         [(5, 'b'), (5, 'd'), (4, 'e')])
+        self.assertEqual(bucket.contents(), [])
+
+    def test_none_kept(self):
+        """
+        Ensure a TopKBucket of k 0 keeps no values, and extend skips
+        values which are None.
+
+        :return:
+        """
+        bucket = TopKBucket(0)
+        bucket.extend([1, None, 2])
+        self.assertEqual(bucket.contents(), [])
+
+        bucket = TopKBucket(2)
+        bucket.extend([None, 1, None])
+        self.assertEqual(bucket.contents(), [1])
+
+    @inlineCallbacks
+    def test_batch_accumulate(self):
+        """
+        Ensure a TopKBucket is a spigot of batch_accumulate.
+
+        :return:
+        """
+        result = yield batch_accumulate(100, iter(range(1000)),
+                                        spigot=TopKBucket(2))
+        self.assertEqual(result, [999, 998])
+
+
+class TestReservoirBucket(unittest.TestCase):
+    def test_reservoir(self):
+        """
+        Ensure the sample is k of the values, and every value is
+        about as likely to be in it.
+
+        :return:
+        """
+        random = Random(3)
+        chosen = [0] * 10
+        for _ in range(2000):
+            bucket = ReservoirBucket(2, random)
+            bucket.extend(range(10))
+            sample = bucket.drain_contents()
+            self.assertEqual(len(set(sample)), 2)
+            for value in sample:
+                chosen[value] += 1
+
+        for count in chosen:
+            self.assertTrue(300 < count < 500, chosen)
+
+    def test_fewer_than_k(self):
+        """
+        Ensure every value is kept while there are fewer than k.
+
+        :return:
+        """
+        bucket = ReservoirBucket(5)
+        bucket.extend([1, 2])
+        bucket(None)
+        self.assertEqual(bucket.contents(), [1, 2])
+        self.assertEqual(bucket.count, 2)
+
+
+class TestHistogramBucket(unittest.TestCase):
+    def test_histogram(self):
+        """
+        Ensure numbers are counted in their bin, or under or over.
+
+        :return:
+        """
+        bucket = HistogramBucket(0, 10, bins=5)
+        bucket.extend([-1, 0, 1.9, 2, 9.99, 10, 12])
+
+        self.assertEqual(bucket.drain_contents(), {
+            'edges': [0, 2.0, 4.0, 6.0, 8.0, 10],
+            'counts': [2, 1, 0, 0, 1],
+            'under': 1,
+            'over': 2})
+        self.assertEqual(bucket.contents()['counts'], [0] * 5)
+
+
+class TestQuantileBucket(unittest.TestCase):
+    def test_quantiles(self):
+        """
+        Ensure each quantile is within the relative accuracy.
+
+        :return:
+        """
+        bucket = QuantileBucket(quantiles=(0.0, 0.5, 0.99, 1.0),
+                                relative_accuracy=0.01)
+        bucket.extend(range(-100, 1001))
+
+        for fraction, expected in [(0.0, -100), (0.5, 450),
+                                   (0.99, 989), (1.0, 1000)]:
+            estimate = bucket.contents()[fraction]
+            self.assertTrue(abs(estimate - expected) <= 0.01 * abs(expected),
+                            (fraction, estimate))
+        self.assertEqual(bucket.quantile(100 / 1100.0), 0.0)
+        self.assertTrue(len(bucket._positive) < 400)
+
+        bucket.drain_contents()
+        self.assertEqual(bucket.quantile(0.5), None)
+
+
+class TestStatsBucket(unittest.TestCase):
+    @inlineCallbacks
+    def test_stats(self):
+        """
+        Ensure the count, sum, mean, sample variance, min and max
+        are those of the numbers.
+
+        :return:
+        """
+        result = yield accumulate(iter([2, 4, None, 4, 4, 5, 5, 7, 9]),
+                                  spigot=StatsBucket())
+        self.assertEqual(result['count'], 8)
+        self.assertEqual(result['sum'], 40)
+        self.assertAlmostEqual(result['mean'], 5.0)
+        self.assertAlmostEqual(result['variance'], 32 / 7.0)
+        self.assertEqual((result['min'], result['max']), (2, 9))
+
+    def test_empty(self):
+        """
+        Ensure there is no mean or variance without enough numbers.
+
+        :return:
+        """
+        bucket = StatsBucket()
+        self.assertEqual(bucket.contents()['mean'], None)
+        bucket(1)
+        self.assertEqual(bucket.contents()['variance'], None)
@@ -0,0 +1,145 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+
+from twisted.trial import unittest
+
+try:
+    import asyncio
+    from cooperative.aio import Cooperator
+    from cooperative.aio import accumulate
+    from cooperative.aio import batch_accumulate
+except ImportError:
+    asyncio = None
+
+
+def i_watch(called, name, count):
+    """
+    Yield count numbers, recording name in called for each.
+
+    :param called: A list.
+    :param name:
+    :param count:
+    :return:
+    """
+    for value in range(count):
+        called.append(name)
+        yield value
+
+
+class TestAio(unittest.TestCase):
+    if asyncio is None:
+        skip = "asyncio requires Python 3"
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def test_accumulate(self):
+        """
+        Ensure accumulate yields a deque of the non-None values.
+
+        :return:
+        """
+        result = self.loop.run_until_complete(
+            accumulate(None if value % 2 else value for value in range(7)))
+        self.assertEqual(result, deque([0, 2, 4, 6]))
+
+    def test_batch_accumulate(self):
+        """
+        Ensure batch_accumulates of several generators alternate,
+        one batch at a time.
+
+        :return:
+        """
+        called = []
+        futures = asyncio.gather(
+            batch_accumulate(2, i_watch(called, "a", 4)),
+            batch_accumulate(3, i_watch(called, "b", 3)))
+        result = self.loop.run_until_complete(futures)
+
+        self.assertEqual(result, [deque(range(4)), deque(range(3))])
+        self.assertEqual(called, ["a", "a", "b", "b", "b", "a", "a"])
+
+    def test_slices(self):
+        """
+        Ensure the event loop runs callbacks between slices.
+
+        :return:
+        """
+        now = [0.0]
+        called = []
+
+        def i_costly():
+            for value in i_watch(called, "task", 6):
+                now[0] += 0.004
+                yield value
+
+        def tick():
+            called.append("tick")
+
+        cooperator = Cooperator(slice_budget=0.01, timer=lambda: now[0])
+        future = accumulate(i_costly(), cooperator)
+        self.loop.call_soon(tick)
+        self.loop.run_until_complete(future)
+
+        self.assertEqual(called, ["task"] * 3 + ["tick"] + ["task"] * 3)
+
+    def test_pause(self):
+        """
+        Ensure a task yielding a Future is paused until it is done.
+
+        :return:
+        """
+        waiting = self.loop.create_future()
+        called = []
+
+        def i_waiting():
+            called.append(1)
+            yield waiting
+            called.append(2)
+            yield 2
+
+        future = accumulate(i_waiting())
+        self.loop.call_later(0.01, waiting.set_result, None)
+        result = self.loop.run_until_complete(future)
+
+        self.assertEqual(called, [1, 2])
+        self.assertEqual(result, deque([waiting, 2]))
+
+    def test_failure(self):
+        """
+        Ensure an error from the generator is raised by the Future.
+
+        :return:
+        """
+        def i_fail():
+            yield 1
+            raise IndexError(1)
+
+        future = batch_accumulate(3, i_fail())
+        self.assertRaises(IndexError, self.loop.run_until_complete, future)
+
+    def test_cancel(self):
+        """
+        Ensure cancelling the Future stops iterating over the generator.
+
+        :return:
+        """
+        called = []
+        now = [0.0]
+
+        def i_costly():
+            for value in i_watch(called, "task", 100):
+                now[0] += 0.004
+                yield value
+
+        cooperator = Cooperator(slice_budget=0.01, timer=lambda: now[0])
+        future = accumulate(i_costly(), cooperator)
+        self.loop.call_soon(future.cancel)
+        self.assertRaises(asyncio.CancelledError,
+                          self.loop.run_until_complete, future)
+        self.assertEqual(len(called), 3)
@@ -0,0 +1,128 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import Clock
+from twisted.trial import unittest
+
+from cooperative.cache import AccumulationCache
+
+
+class TestAccumulationCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.started = []
+
+    def i_numbers(self, count):
+        """
+        Yield count numbers, recording that it started.
+        """
+        self.started.append(count)
+        for value in range(count):
+            yield value
+
+    @inlineCallbacks
+    def test_single_flight(self):
+        """
+        Ensure concurrent calls with the same arguments share one
+        accumulation, and later ones use the result kept.
+
+        :return:
+        """
+        cache = AccumulationCache(clock=self.clock)
+        result = yield defer.gatherResults([
+            cache.batch_accumulate(2, self.i_numbers, 5),
+            cache.batch_accumulate(3, self.i_numbers, 5),
+            cache.accumulate(self.i_numbers, 3)])
+        self.assertEqual(result, [deque(range(5)), deque(range(5)),
+                                  deque(range(3))])
+        self.assertIs(result[0], result[1])
+
+        result = yield cache.batch_accumulate(2, self.i_numbers, 5)
+        self.assertEqual(result, deque(range(5)))
+        self.assertEqual(self.started, [5, 3])
+        self.assertEqual(cache.stats(), {'hits': 1, 'joins': 1, 'misses': 2,
+                                         'entries': 2, 'values': 0,
+                                         'in_flight': 0})
+
+    def test_lru(self):
+        """
+        Ensure the least recently used result is evicted past
+        max_entries.
+
+        :return:
+        """
+        cache = AccumulationCache(max_entries=2, clock=self.clock)
+        for key in ('a', 'b', 'a', 'c'):
+            cache.call(key, lambda: defer.succeed(key.upper()))
+
+        self.assertEqual(list(cache._entries), ['a', 'c'])
+
+    def test_max_values(self):
+        """
+        Ensure results are evicted to keep their total size
+        within max_values, and larger ones are not kept.
+
+        :return:
+        """
+        cache = AccumulationCache(max_values=5, clock=self.clock)
+        cache.call('a', lambda: defer.succeed([1, 2]))
+        cache.call('b', lambda: defer.succeed([1, 2, 3]))
+        cache.call('c', lambda: defer.succeed([1]))
+        cache.call('d', lambda: defer.succeed(range(6)))
+
+        self.assertEqual(list(cache._entries), ['b', 'c'])
+        self.assertEqual(cache.stats()['values'], 4)
+
+    def test_ttl(self):
+        """
+        Ensure a result is not used after ttl seconds.
+
+        :return:
+        """
+        cache = AccumulationCache(ttl=10, clock=self.clock)
+        calls = []
+
+        def start():
+            calls.append(1)
+            return defer.succeed(len(calls))
+
+        self.assertEqual(self.successResultOf(cache.call('a', start)), 1)
+        self.clock.advance(9)
+        self.assertEqual(self.successResultOf(cache.call('a', start)), 1)
+        self.clock.advance(1)
+        self.assertEqual(self.successResultOf(cache.call('a', start)), 2)
+
+    def test_failure(self):
+        """
+        Ensure every caller waiting gets a failure,
+        which is not kept.
+
+        :return:
+        """
+        cache = AccumulationCache(clock=self.clock)
+        pending = defer.Deferred()
+        d1 = cache.call('a', lambda: pending)
+        d2 = cache.call('a', lambda: pending)
+        pending.errback(IndexError())
+
+        self.failureResultOf(d1, IndexError)
+        self.failureResultOf(d2, IndexError)
+        self.assertEqual(len(cache), 0)
+
+    def test_cancel_one(self):
+        """
+        Ensure cancelling one caller leaves the others waiting.
+
+        :return:
+        """
+        cache = AccumulationCache(clock=self.clock)
+        pending = defer.Deferred()
+        d1 = cache.call('a', lambda: pending)
+        d2 = cache.call('a', lambda: pending)
+        d1.cancel()
+        pending.callback(1)
+
+        self.failureResultOf(d1, defer.CancelledError)
+        self.assertEqual(self.successResultOf(d2), 1)
@@ -0,0 +1,93 @@
+# _*_ coding: utf-8 _*_
+import os
+from collections import deque
+from operator import add
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative import ReduceBucket
+from cooperative import ValueBucket
+from cooperative.checkpoint import Replayable
+from cooperative.checkpoint import read_checkpoint
+from cooperative.checkpoint import resumable_batch_accumulate
+from cooperative.checkpoint import write_checkpoint
+
+
+class Broken(Exception):
+    pass
+
+
+def i_numbers(count, broken_at=None):
+    for value in range(count):
+        if value == broken_at:
+            raise Broken()
+        yield value
+
+
+class TestReplayable(unittest.TestCase):
+    def test_restore(self):
+        """
+        Ensure a restored Replayable yields None for the values
+        before its position.
+
+        :return:
+        """
+        replayable = Replayable(i_numbers, 5)
+        replayable.restore(2)
+        self.assertEqual(list(replayable), [None, None, 2, 3, 4])
+        self.assertEqual(replayable.position(), 5)
+
+
+class TestResumableBatchAccumulate(unittest.TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+
+    @inlineCallbacks
+    def test_done(self):
+        """
+        Ensure the accumulation is like batch_accumulate, and the
+        checkpoint is removed once it is done.
+
+        :return:
+        """
+        result = yield resumable_batch_accumulate(
+            3, Replayable(i_numbers, 10), self.path, interval=0)
+        self.assertEqual(result, deque(range(10)))
+        self.assertFalse(os.path.exists(self.path))
+
+    @inlineCallbacks
+    def test_resume(self):
+        """
+        Ensure an accumulation which failed resumes from its last
+        checkpoint, with the values it had accumulated.
+
+        :return:
+        """
+        yield self.assertFailure(
+            resumable_batch_accumulate(
+                2, Replayable(i_numbers, 10, 7), self.path, interval=0),
+            Broken)
+        position, spigot = read_checkpoint(self.path)
+        self.assertEqual(position, 6)
+        self.assertEqual(spigot.contents(), deque(range(6)))
+
+        result = yield resumable_batch_accumulate(
+            2, Replayable(i_numbers, 10), self.path, interval=0)
+        self.assertEqual(result, deque(range(10)))
+
+    @inlineCallbacks
+    def test_resume_fold(self):
+        """
+        Ensure the running state of a ReduceBucket is resumed.
+
+        :return:
+        """
+        spigot = ReduceBucket(add, 0)
+        spigot.extend(range(4))
+        write_checkpoint(self.path, 4, spigot)
+
+        result = yield resumable_batch_accumulate(
+            2, Replayable(i_numbers, 6), self.path,
+            spigot=ValueBucket())
+        self.assertEqual(result, sum(range(6)))
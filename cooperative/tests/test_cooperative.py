@@ -1,20 +1,48 @@
 # _*_ coding: utf-8 _*_
+from array import array
 from collections import deque
 from itertools import chain
+from operator import add
+from threading import current_thread
 
 from twisted.internet import defer
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.task import Clock
 from twisted.internet.task import Cooperator
 from twisted.internet.task import LoopingCall
 from twisted.python import log
+from twisted.python.threadpool import ThreadPool
 from twisted.trial import unittest
 
 from stream_tap import Bucket
+from stream_tap import stream_tap
 
+from iter_karld_tools import i_batch
+
+import cooperative
+from cooperative import ArrayBucket
+from cooperative import NumpyBucket
+from cooperative import PriorityCooperator
+from cooperative import ReduceBucket
+from cooperative import ValueBucket
 from cooperative import accumulation_handler
 from cooperative import accumulate
+from cooperative import adaptive_batch_accumulate
 from cooperative import batch_accumulate
+from cooperative import batch_reduce
+from cooperative import batch_stream
+from cooperative import when_done
+from cooperative import chunk_accumulate
+from cooperative import configure
+from cooperative import cooperative_map
+from cooperative import i_adaptive_batch
+from cooperative import i_chunk_batch
+from cooperative import i_fast_batch
+from cooperative import i_weighted
+from cooperative import make_cooperator
+from cooperative import numpy
+from cooperative import reset_configuration
 
 
 class TestHandler(unittest.TestCase):
@@ -387,3 +415,979 @@ class TestAccumulate(unittest.TestCase):
         #   when it is it's turn.
         self.assertEqual(called,
                          [10, 25, 1108, 1109, 1108, 155, 11, 26, 1109, 156])
+
+
+class FakeTimer(object):
+    """
+    A timer whose time only moves when advanced.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def costly(self, cost, iterable):
+        """
+        Pass through the items of iterable, advancing time by
+        cost seconds for each.
+        """
+        for item in iterable:
+            self.now += cost
+            yield item
+
+
+class TestAdaptiveBatch(unittest.TestCase):
+    def test_batch_size_converges(self):
+        """
+        Ensure the batch size doubles until consuming a batch
+        takes about the target duration, then holds.
+
+        :return:
+        """
+        timer = FakeTimer()
+        items = timer.costly(0.001, range(100))
+        batches = list(i_adaptive_batch(0.01, items, timer=timer))
+
+        self.assertEqual([len(batch) for batch in batches],
+                         [1, 2, 4, 8] + [10] * 8 + [5])
+        self.assertEqual(list(chain.from_iterable(batches)), range(100))
+
+    def test_batch_size_shrinks(self):
+        """
+        Ensure the batch size shrinks right away when items
+        become more expensive.
+
+        :return:
+        """
+        timer = FakeTimer()
+        items = chain(timer.costly(0.001, range(15)),
+                      timer.costly(0.005, range(15, 30)))
+        batches = list(i_adaptive_batch(0.01, items, timer=timer))
+
+        self.assertEqual([len(batch) for batch in batches],
+                         [1, 2, 4, 8, 10, 2, 2, 1])
+        self.assertEqual(list(chain.from_iterable(batches)), range(30))
+
+    def test_max_size(self):
+        """
+        Ensure the batch size does not grow past max_size.
+
+        :return:
+        """
+        timer = FakeTimer()
+        batches = list(i_adaptive_batch(0.01, range(20),
+                                        timer=timer, max_size=3))
+
+        self.assertEqual([len(batch) for batch in batches],
+                         [1, 2, 3, 3, 3, 3, 3, 2])
+
+    @inlineCallbacks
+    def test_adaptive_batch_accumulate(self):
+        """
+        Ensure adaptive_batch_accumulate yields the non-None values
+        of the generator in order.
+
+        :return:
+        """
+        result = yield adaptive_batch_accumulate(
+            0.002, (None if value % 3 else value for value in range(20)))
+        self.assertEqual(result, deque([0, 3, 6, 9, 12, 15, 18]))
+
+
+class TestBatchReduce(unittest.TestCase):
+    @inlineCallbacks
+    def test_batch_reduce(self):
+        """
+        Ensure batch_reduce folds the non-None values of the generator
+        into the initial value, in order.
+
+        :return:
+        """
+        result = yield batch_reduce(
+            add, 0, 3, (None if value % 2 else value for value in range(10)))
+        self.assertEqual(result, 20)
+
+        result = yield batch_reduce(
+            lambda total, value: total + [value], [], 2, iter("abc"))
+        self.assertEqual(result, ["a", "b", "c"])
+
+    @inlineCallbacks
+    def test_empty(self):
+        """
+        Ensure batch_reduce of an empty generator is the initial value.
+
+        :return:
+        """
+        result = yield batch_reduce(add, 7, 3, iter([]))
+        self.assertEqual(result, 7)
+
+    @inlineCallbacks
+    def test_failure(self):
+        """
+        Ensure an error raised by fn fails the Deferred.
+
+        :return:
+        """
+        d = batch_reduce(add, 0, 3, iter([1, "2"]))
+        yield self.assertFailure(d, TypeError)
+
+
+def manual_cooperator():
+    """
+    A Cooperator which only iterates when its _tick is called, and then
+    keeps iterating until every task is paused or done.
+
+    :return: Cooperator
+    """
+    return Cooperator(terminationPredicateFactory=lambda: lambda: False,
+                      scheduler=lambda tick: None)
+
+
+class TestBatchStream(unittest.TestCase):
+    @inlineCallbacks
+    def test_batch_stream(self):
+        """
+        Ensure batch_stream hands the non-None values of each batch
+        to the sink, in order, and fires with None.
+
+        :return:
+        """
+        delivered = []
+        result = yield batch_stream(
+            3, (None if value == 4 else value for value in range(8)),
+            delivered.append)
+
+        self.assertEqual(result, None)
+        self.assertEqual(delivered, [deque([0, 1, 2]),
+                                     deque([3, 5]),
+                                     deque([6, 7])])
+
+    def test_backpressure(self):
+        """
+        Ensure the generator is not iterated over while the Deferred
+        returned by the sink is unfired.
+
+        :return:
+        """
+        cooperator = manual_cooperator()
+        consumed = []
+        pending = []
+
+        def sink(contents):
+            pending.append(defer.Deferred())
+            return pending[-1]
+
+        d = batch_stream(2, stream_tap((consumed.append,), range(5)),
+                         sink, cooperator)
+
+        cooperator._tick()
+        self.assertEqual(consumed, [0, 1])
+        cooperator._tick()
+        self.assertEqual(consumed, [0, 1])
+
+        pending[-1].callback(None)
+        cooperator._tick()
+        self.assertEqual(consumed, [0, 1, 2, 3])
+
+        pending[-1].callback(None)
+        cooperator._tick()
+        pending[-1].callback(None)
+        cooperator._tick()
+        self.assertEqual(consumed, range(5))
+        self.assertEqual(self.successResultOf(d), None)
+
+    def test_sink_failure(self):
+        """
+        Ensure a failed Deferred from the sink fails batch_stream.
+
+        :return:
+        """
+        d = batch_stream(2, iter(range(5)),
+                         lambda contents: defer.fail(ValueError()))
+        return self.assertFailure(d, ValueError)
+
+
+class TestThreadPool(unittest.TestCase):
+    def setUp(self):
+        self.threadpool = ThreadPool(0, 2)
+        self.threadpool.start()
+
+    def tearDown(self):
+        self.threadpool.stop()
+
+    @inlineCallbacks
+    def test_batch_accumulate(self):
+        """
+        Ensure batch_accumulate with a threadpool iterates over the
+        generator in its threads and accumulates the non-None values
+        in order on the reactor thread.
+
+        :return:
+        """
+        reactor_thread = current_thread()
+        threads = set()
+
+        def i_record_threads(count):
+            for value in range(count):
+                threads.add(current_thread())
+                yield None if value % 2 else value
+
+        result = yield batch_accumulate(3, i_record_threads(10),
+                                        threadpool=self.threadpool)
+
+        self.assertEqual(result, deque([0, 2, 4, 6, 8]))
+        self.assertTrue(threads)
+        self.assertNotIn(reactor_thread, threads)
+
+    @inlineCallbacks
+    def test_accumulate(self):
+        """
+        Ensure accumulate with a threadpool accumulates
+        the values of the generator.
+
+        :return:
+        """
+        result = yield accumulate(i_get_tenth_11(range(110, 150)),
+                                  threadpool=self.threadpool)
+        self.assertEqual(result, deque([120, 121]))
+
+    @inlineCallbacks
+    def test_accumulate_batches(self):
+        """
+        Ensure accumulate with a threadpool goes to a thread once for
+        each batch of thread_batch_size values, and once more to find
+        the generator is done, not for each value.
+
+        :return:
+        """
+        calls = []
+        call_in_thread = self.threadpool.callInThreadWithCallback
+
+        def count_calls(*args, **kwargs):
+            calls.append(args)
+            return call_in_thread(*args, **kwargs)
+
+        self.patch(self.threadpool, 'callInThreadWithCallback', count_calls)
+        result = yield accumulate(iter(range(10)), threadpool=self.threadpool,
+                                  thread_batch_size=4)
+        self.assertEqual(result, deque(range(10)))
+        self.assertEqual(len(calls), 4)
+
+    @inlineCallbacks
+    def test_concurrent(self):
+        """
+        Ensure several generators can share the threadpool.
+
+        :return:
+        """
+        result = yield defer.gatherResults([
+            batch_accumulate(2, iter(range(start, start + 5)),
+                             threadpool=self.threadpool)
+            for start in (0, 10, 20)])
+        self.assertEqual(result, [deque(range(0, 5)),
+                                  deque(range(10, 15)),
+                                  deque(range(20, 25))])
+
+    def test_failure(self):
+        """
+        Ensure an error raised by the generator in a thread
+        fails the Deferred.
+
+        :return:
+        """
+        d = batch_accumulate(2, i_get_tenth_11(range(5)),
+                             threadpool=self.threadpool)
+        return self.assertFailure(d, IndexError)
+
+
+class TestArrayBucket(unittest.TestCase):
+    def test_array_bucket(self):
+        """
+        Ensure an ArrayBucket accumulates non-None values in an array
+        and drains it.
+
+        :return:
+        """
+        spigot = ArrayBucket('l')
+        spigot(1)
+        spigot(None)
+        spigot(2)
+
+        self.assertEqual(spigot.contents(), array('l', [1, 2]))
+        self.assertEqual(spigot.drain_contents(), array('l', [1, 2]))
+        self.assertEqual(spigot.contents(), array('l'))
+
+    @inlineCallbacks
+    def test_typecode(self):
+        """
+        Ensure accumulate and batch_accumulate with a typecode
+        yield an array of the values.
+
+        :return:
+        """
+        result = yield batch_accumulate(3, (value / 2.0 for value in range(5)),
+                                        typecode='d')
+        self.assertEqual(result, array('d', [0.0, 0.5, 1.0, 1.5, 2.0]))
+
+        result = yield accumulate(i_get_tenth_11(range(110, 150)),
+                                  typecode='l')
+        self.assertEqual(result, array('l', [120, 121]))
+
+
+class TestNumpyBucket(unittest.TestCase):
+    if numpy is None:
+        skip = "numpy is not installed"
+
+    def test_growth(self):
+        """
+        Ensure a NumpyBucket grows past its initial capacity
+        and drains to a view of its values.
+
+        :return:
+        """
+        spigot = NumpyBucket('int64', capacity=2)
+        for value in range(5):
+            spigot(value)
+        spigot(None)
+
+        self.assertEqual(list(spigot.contents()), range(5))
+        contents = spigot.drain_contents()
+        self.assertEqual(contents.dtype, numpy.dtype('int64'))
+        self.assertEqual(memoryview(contents).shape, (5,))
+        self.assertEqual(len(spigot.contents()), 0)
+
+    @inlineCallbacks
+    def test_dtype(self):
+        """
+        Ensure batch_accumulate with a dtype yields
+        a numpy array of the values.
+
+        :return:
+        """
+        result = yield batch_accumulate(4, iter(range(10)), dtype='float64')
+        self.assertEqual(result.dtype, numpy.dtype('float64'))
+        self.assertEqual(result.tolist(), map(float, range(10)))
+
+
+class TestChunkAccumulate(unittest.TestCase):
+    def test_i_chunk_batch(self):
+        """
+        Ensure chunks are batched by the number of values they hold.
+
+        :return:
+        """
+        chunks = [[1, 2], [3], None, [4, 5, 6, 7], [8], [9]]
+        self.assertEqual(list(i_chunk_batch(3, chunks)),
+                         [([1, 2], [3]),
+                          (None, [4, 5, 6, 7]),
+                          ([8], [9])])
+
+    @inlineCallbacks
+    def test_chunk_accumulate(self):
+        """
+        Ensure chunk_accumulate yields a deque of the values
+        of every chunk, in order.
+
+        :return:
+        """
+        chunks = ([value] * value for value in range(4))
+        result = yield chunk_accumulate(2, chunks)
+        self.assertEqual(result, deque([1, 2, 2, 3, 3, 3]))
+
+    @inlineCallbacks
+    def test_typecode(self):
+        """
+        Ensure chunk_accumulate with a typecode extends an array.
+
+        :return:
+        """
+        result = yield chunk_accumulate(
+            2, iter([[1.0, 2.0], None, (3.0,)]), typecode='d')
+        self.assertEqual(result, array('d', [1.0, 2.0, 3.0]))
+
+    def test_reduce_extend(self):
+        """
+        Ensure a ReduceBucket folds every value of a chunk.
+
+        :return:
+        """
+        spigot = ReduceBucket(add, 0)
+        spigot.extend([1, 2, 3])
+        spigot.extend(None)
+        self.assertEqual(spigot.contents(), 6)
+
+    @inlineCallbacks
+    def test_numpy_chunks(self):
+        """
+        Ensure chunk_accumulate with a dtype extends a numpy
+        array with numpy array chunks.
+
+        :return:
+        """
+        if numpy is None:
+            raise unittest.SkipTest("numpy is not installed")
+
+        chunks = (numpy.arange(start, start + 700) for start in (0, 700, 1400))
+        result = yield chunk_accumulate(1000, chunks, dtype='int64')
+        self.assertEqual(result.tolist(), range(2100))
+
+
+class TestPriority(unittest.TestCase):
+    def test_i_weighted(self):
+        """
+        Ensure a turn which overspends its credit is followed by turns
+        which skip consuming items until the deficit is repaid.
+
+        :return:
+        """
+        timer = FakeTimer()
+        consumed = []
+        items = timer.costly(0.375, stream_tap((consumed.append,),
+                                               range(10)))
+        turns = i_weighted(1, items, quantum=0.25, timer=timer)
+
+        next(turns)
+        self.assertEqual(consumed, [0])
+        next(turns)
+        self.assertEqual(consumed, [0, 1])
+        next(turns)
+        self.assertEqual(consumed, [0, 1])
+        next(turns)
+        self.assertEqual(consumed, [0, 1, 2])
+
+    def test_i_weighted_turn(self):
+        """
+        Ensure one turn at a large weight takes no longer than quantum.
+
+        :return:
+        """
+        timer = FakeTimer()
+        consumed = []
+        items = timer.costly(0.125, stream_tap((consumed.append,),
+                                               range(10)))
+        turns = i_weighted(100, items, quantum=0.25, timer=timer,
+                           top_weight=lambda: 100)
+
+        next(turns)
+        self.assertEqual(consumed, [0, 1])
+        self.assertLessEqual(timer.now, 0.25)
+
+    def test_i_weighted_deferred(self):
+        """
+        Ensure a Deferred from the iterable is yielded right away.
+
+        :return:
+        """
+        pause = defer.Deferred()
+        turns = i_weighted(100, iter([1, pause, 2]))
+        self.assertIs(next(turns), pause)
+        self.assertEqual(list(turns), [])
+
+    def test_weighted_share(self):
+        """
+        Ensure tasks of a PriorityCooperator share time in proportion
+        to their priority, while the lowest priority still progresses.
+
+        :return:
+        """
+        timer = FakeTimer()
+        cooperator = PriorityCooperator(
+            quantum=0.25, timer=timer,
+            terminationPredicateFactory=lambda: lambda: False,
+            scheduler=lambda tick: None)
+        consumed = []
+
+        def i_costly(name):
+            for value in range(40):
+                timer.now += 0.25
+                consumed.append(name)
+                yield value
+
+        low = cooperator.cooperate(i_costly("low"), priority=1)
+        high = cooperator.cooperate(i_costly("high"), priority=4)
+        low_task_done = low.whenDone()
+
+        cooperator._tick()
+        self.assertEqual(consumed[:10], ["low", "high", "high", "high",
+                                         "high", "low", "high", "high",
+                                         "high", "high"])
+        self.assertEqual(consumed[-1], "low")
+        self.assertTrue(self.successResultOf(low_task_done))
+
+    @inlineCallbacks
+    def test_accumulate_priority(self):
+        """
+        Ensure accumulate and batch_accumulate with a priority
+        yield the values of the generator.
+
+        :return:
+        """
+        result = yield defer.gatherResults([
+            accumulate(i_get_tenth_11(range(110, 150)), priority=5),
+            batch_accumulate(3, iter(range(7)), priority=1)])
+        self.assertEqual(result, [deque([120, 121]), deque(range(7))])
+
+
+class TestCancel(unittest.TestCase):
+    def setUp(self):
+        """
+        Create a Cooperator which iterates once each time it is ticked.
+
+        :return:
+        """
+        self.cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=lambda tick: None)
+        self.consumed = []
+        self.items = stream_tap((self.consumed.append,), range(10))
+
+    def test_cancel(self):
+        """
+        Ensure cancelling the Deferred stops iterating over the generator
+        and fails with a CancelledError.
+
+        :return:
+        """
+        d = batch_accumulate(2, self.items, self.cooperator)
+        self.cooperator._tick()
+        d.cancel()
+        self.cooperator._tick()
+
+        self.assertEqual(self.consumed, [0, 1])
+        self.failureResultOf(d, defer.CancelledError)
+
+    def test_partial_results(self):
+        """
+        Ensure cancelling with partial_results fires with the values
+        accumulated so far.
+
+        :return:
+        """
+        d = batch_accumulate(3, self.items, self.cooperator,
+                             partial_results=True)
+        self.cooperator._tick()
+        self.cooperator._tick()
+        d.cancel()
+        self.cooperator._tick()
+
+        self.assertEqual(self.successResultOf(d), deque(range(6)))
+        self.assertEqual(self.consumed, range(6))
+
+    def test_timeout(self):
+        """
+        Ensure the Deferred fails with a TimeoutError after the timeout,
+        and the generator is not iterated over again.
+
+        :return:
+        """
+        clock = Clock()
+        d = accumulate(self.items, self.cooperator, timeout=5, clock=clock)
+        self.cooperator._tick()
+        clock.advance(5)
+        self.cooperator._tick()
+
+        self.assertEqual(self.consumed, [0])
+        self.failureResultOf(d, defer.TimeoutError)
+
+    def test_timeout_partial_results(self):
+        """
+        Ensure the Deferred fires with the values accumulated so far
+        after the timeout, with partial_results.
+
+        :return:
+        """
+        clock = Clock()
+        d = batch_accumulate(3, iter([1, None, 2, 3, 4]), self.cooperator,
+                             timeout=1, partial_results=True, clock=clock)
+        self.cooperator._tick()
+        clock.advance(1)
+
+        self.assertEqual(self.successResultOf(d), deque([1, 2]))
+
+    def test_done_before_timeout(self):
+        """
+        Ensure the timeout is cancelled when the task is done in time.
+
+        :return:
+        """
+        clock = Clock()
+        d = batch_accumulate(5, self.items, self.cooperator,
+                             timeout=1, clock=clock)
+        for _ in range(3):
+            self.cooperator._tick()
+
+        self.assertEqual(self.successResultOf(d), deque(range(10)))
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_when_done_failure(self):
+        """
+        Ensure when_done fails with the error of the task.
+
+        :return:
+        """
+        d = when_done(self.cooperator.cooperate(i_get_tenth_11(range(3))),
+                      ValueBucket())
+        self.cooperator._tick()
+        self.failureResultOf(d, IndexError)
+
+
+class TestConfigure(unittest.TestCase):
+    def tearDown(self):
+        reset_configuration()
+
+    def test_slice_budget(self):
+        """
+        Ensure a round of a cooperator from make_cooperator
+        ends once slice_budget seconds have passed.
+
+        :return:
+        """
+        timer = FakeTimer()
+        clock = Clock()
+        cooperator = make_cooperator(0.01, 0.1, clock=clock, timer=timer)
+        consumed = []
+        d = batch_accumulate(2, stream_tap((consumed.append,),
+                                           timer.costly(0.002, range(20))),
+                             cooperator)
+
+        clock.advance(0.1)
+        self.assertEqual(consumed, range(6))
+        clock.advance(0.1)
+        self.assertEqual(consumed, range(12))
+        clock.pump([0.1] * 3)
+        self.assertEqual(self.successResultOf(d), deque(range(20)))
+
+    def test_delay(self):
+        """
+        Ensure the next round starts delay seconds after a round.
+
+        :return:
+        """
+        clock = Clock()
+        cooperator = make_cooperator(0.01, 0.5, clock=clock,
+                                     timer=lambda: 0.0)
+        d = accumulate(iter(range(3)), cooperator)
+
+        clock.advance(0.4)
+        self.assertNoResult(d)
+        clock.advance(0.1)
+        self.assertEqual(self.successResultOf(d), deque(range(3)))
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_configure(self):
+        """
+        Ensure configure sets the cooperators used when none is given.
+
+        :return:
+        """
+        clock = Clock()
+        configure(0.01, 1, clock=clock)
+
+        d1 = batch_accumulate(2, iter(range(5)))
+        d2 = accumulate(iter(range(3)), priority=2)
+        self.assertEqual(len(clock.getDelayedCalls()), 2)
+
+        clock.advance(1)
+        self.assertEqual(self.successResultOf(d1), deque(range(5)))
+        self.assertEqual(self.successResultOf(d2), deque(range(3)))
+
+    def test_reset_configuration(self):
+        """
+        Ensure reset_configuration goes back to twisted's cooperator,
+        and a new PriorityCooperator.
+
+        :return:
+        """
+        clock = Clock()
+        configure(0.01, 1, clock=clock)
+        reset_configuration()
+
+        self.assertIs(cooperative.default_cooperator, None)
+        self.assertIsInstance(cooperative.default_priority_cooperator,
+                              PriorityCooperator)
+        accumulate(iter(range(3)))
+        accumulate(iter(range(3)), priority=2)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+
+class TestCooperativeMap(unittest.TestCase):
+    def setUp(self):
+        self.active = []
+        self.most_active = [0]
+
+    def i_counting(self, number):
+        """
+        Yield the first number numbers, recording how many
+        of these generators are active at once.
+        """
+        self.active.append(number)
+        self.most_active[0] = max(self.most_active[0], len(self.active))
+        for value in range(number):
+            yield value
+        self.active.remove(number)
+
+    @inlineCallbacks
+    def test_ordered(self):
+        """
+        Ensure the results are in the order of the inputs and no more
+        than concurrency generators are active at once.
+
+        :return:
+        """
+        result = yield cooperative_map(self.i_counting, [5, 1, 3, 0, 2],
+                                       concurrency=2, max_batch_size=2)
+
+        self.assertEqual(result, [deque(range(5)), deque([0]),
+                                  deque(range(3)), deque(), deque(range(2))])
+        self.assertEqual(self.most_active[0], 2)
+
+    @inlineCallbacks
+    def test_unordered(self):
+        """
+        Ensure the results are in the order they finish in, with
+        the index of their input, when not ordered.
+
+        :return:
+        """
+        result = yield cooperative_map(self.i_counting, [6, 1, 2],
+                                       concurrency=2, ordered=False)
+        self.assertEqual(result, [(1, deque([0])), (2, deque(range(2))),
+                                  (0, deque(range(6)))])
+
+    def test_sink(self):
+        """
+        Ensure the sink is called in order of the inputs, and the inputs
+        are not all started while it holds back.
+
+        :return:
+        """
+        cooperator = manual_cooperator()
+        started = []
+        delivered = []
+        pending = []
+
+        def fn(number):
+            started.append(number)
+            return self.i_counting(number)
+
+        def sink(index, result):
+            delivered.append((index, result))
+            pending.append(defer.Deferred())
+            return pending[-1]
+
+        d = cooperative_map(fn, [3, 1, 2, 4], concurrency=2,
+                            cooperator=cooperator, sink=sink)
+        cooperator._tick()
+        self.assertEqual(started, [3, 1, 2])
+        self.assertEqual(delivered, [(0, deque(range(3))), (1, deque([0])),
+                                     (2, deque(range(2)))])
+
+        while pending:
+            pending.pop(0).callback(None)
+            cooperator._tick()
+
+        self.assertEqual(self.successResultOf(d), None)
+        self.assertEqual(started, [3, 1, 2, 4])
+        self.assertEqual(delivered, [(0, deque(range(3))), (1, deque([0])),
+                                     (2, deque(range(2))),
+                                     (3, deque(range(4)))])
+        self.assertEqual(self.most_active[0], 2)
+
+    def test_waiting_results(self):
+        """
+        Ensure no input is started while concurrency results wait
+        on an earlier input.
+
+        :return:
+        """
+        cooperator = manual_cooperator()
+        started = []
+        first = defer.Deferred()
+
+        def fn(number):
+            started.append(number)
+            if not started[1:]:
+                return first.addCallback(lambda _: self.i_counting(number))
+            return self.i_counting(number)
+
+        d = cooperative_map(fn, range(6), concurrency=2,
+                            cooperator=cooperator)
+        cooperator._tick()
+        self.assertEqual(started, [0, 1, 2])
+
+        first.callback(None)
+        cooperator._tick()
+        self.assertEqual(self.successResultOf(d),
+                         [deque(range(number)) for number in range(6)])
+
+    def test_concurrency(self):
+        """
+        Ensure a concurrency less than 1 is refused.
+
+        :return:
+        """
+        self.assertRaises(ValueError, cooperative_map, self.i_counting,
+                          [1], concurrency=0)
+
+    def test_failure(self):
+        """
+        Ensure an error fails the Deferred with that error,
+        and no more inputs are started.
+
+        :return:
+        """
+        started = []
+
+        def fn(value):
+            started.append(value)
+            return i_get_tenth_11(range(value))
+
+        d = cooperative_map(fn, [20, 5, 30, 40, 50], concurrency=1)
+        d = self.assertFailure(d, IndexError)
+        d.addCallback(lambda _: self.assertEqual(started, [20, 5]))
+        return d
+
+    def i_forever(self, name):
+        """
+        Yield name, recording it, forever.
+        """
+        while True:
+            self.active.append(name)
+            yield name
+
+    def test_failure_cancels(self):
+        """
+        Ensure an error fails the Deferred right away, and stops
+        iterating over the other inputs.
+
+        :return:
+        """
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=lambda tick: None)
+
+        def fn(value):
+            if value is None:
+                return i_get_tenth_11(range(5))
+            return self.i_forever(value)
+
+        d = cooperative_map(fn, ['a', None, 'b'], concurrency=2,
+                            cooperator=cooperator)
+        for _ in range(5):
+            cooperator._tick()
+        self.failureResultOf(d, IndexError)
+
+        consumed = len(self.active)
+        for _ in range(5):
+            cooperator._tick()
+        self.assertEqual(len(self.active), consumed)
+        self.assertNotIn('b', self.active)
+
+    def test_cancel(self):
+        """
+        Ensure cancelling the Deferred stops iterating over the inputs.
+
+        :return:
+        """
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=lambda tick: None)
+        d = cooperative_map(self.i_forever, ['a', 'b', 'c'], concurrency=2,
+                            cooperator=cooperator)
+        for _ in range(5):
+            cooperator._tick()
+        d.cancel()
+        self.failureResultOf(d, defer.CancelledError)
+
+        consumed = len(self.active)
+        for _ in range(5):
+            cooperator._tick()
+        self.assertEqual(len(self.active), consumed)
+        self.assertEqual(set(self.active), set(['a', 'b']))
+
+
+class TestWaitForDeferreds(unittest.TestCase):
+    def test_wait_for_deferreds(self):
+        """
+        Ensure a yielded Deferred pauses the batch, and its result
+        is accumulated in its place.
+
+        :return:
+        """
+        cooperator = manual_cooperator()
+        consumed = []
+        lookup = defer.Deferred()
+        passed_on = []
+
+        def i_values():
+            yield 0
+            yield lookup
+            yield None
+            yield 3
+
+        d = batch_accumulate(
+            5, stream_tap((consumed.append,), i_values()), cooperator,
+            wait_for_deferreds=True)
+
+        cooperator._tick()
+        self.assertEqual(consumed, [0, lookup])
+        self.assertNoResult(d)
+
+        lookup.addCallback(passed_on.append)
+        lookup.callback(2)
+        cooperator._tick()
+        self.assertEqual(self.successResultOf(d), deque([0, 2, 3]))
+        self.assertEqual(passed_on, [2])
+
+    def test_failure(self):
+        """
+        Ensure a yielded Deferred which fails fails the accumulation.
+
+        :return:
+        """
+        d = batch_accumulate(
+            5, iter([1, defer.fail(ValueError()), 3]),
+            wait_for_deferreds=True)
+        return self.assertFailure(d, ValueError)
+
+
+class TestFastBatch(unittest.TestCase):
+    def test_i_fast_batch(self):
+        """
+        Ensure i_fast_batch yields the same batches as i_batch over
+        stream_tap, and fills the spigot with the same values.
+
+        :return:
+        """
+        values = [0, None, '', False, 4, None, 6]
+        tapped = ValueBucket()
+        expected = list(i_batch(3, stream_tap((tapped,), iter(values))))
+
+        spigot = ValueBucket()
+        batches = i_fast_batch(3, iter(values), spigot)
+        self.assertEqual(next(batches), expected[0])
+        self.assertEqual(spigot.contents(), deque([0, '']))
+        self.assertEqual([expected[0]] + list(batches), expected)
+        self.assertEqual(spigot.contents(), tapped.contents())
+
+    @inlineCallbacks
+    def test_spigot_without_extend(self):
+        """
+        Ensure batch_accumulate calls a spigot without an extend method
+        with each value.
+
+        :return:
+        """
+        values = []
+
+        class Spigot(object):
+            def __call__(self, value):
+                values.append(value)
+
+            def drain_contents(self):
+                return values
+
+        result = yield batch_accumulate(2, iter([1, None, 3]),
+                                        spigot=Spigot())
+        self.assertEqual(result, [1, None, 3])
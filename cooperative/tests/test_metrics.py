@@ -0,0 +1,142 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.task import Cooperator
+from twisted.trial import unittest
+
+from cooperative import accumulate
+from cooperative import batch_accumulate
+from cooperative.metrics import MetricsRegistry
+from cooperative.metrics import SLICE_BOUNDS
+from cooperative.metrics import TaskMetrics
+from cooperative.metrics import registry
+
+
+def i_numbers(count):
+    """
+    Yield count numbers.
+
+    :param count:
+    :return:
+    """
+    for value in range(count):
+        yield value
+
+
+class TestTaskMetrics(unittest.TestCase):
+    def test_record_slice(self):
+        """
+        Ensure each slice is counted in the histogram bucket
+        of its duration.
+
+        :return:
+        """
+        task_metrics = TaskMetrics(1, "task", timer=lambda: 10.0)
+        task_metrics.record_slice(11.0, 0.0002, 0.0001)
+        task_metrics.record_slice(11.5, 0.003, 0.003)
+        task_metrics.record_slice(12.0, 5.0, 4.0)
+        task_metrics.finished = 14.0
+
+        snapshot = task_metrics.snapshot(20.0)
+        self.assertEqual(snapshot['slices'], 3)
+        self.assertEqual(snapshot['queue_wait'], 1.0)
+        self.assertEqual(snapshot['wall_time'], 4.0)
+        self.assertEqual(snapshot['max_slice'], 5.0)
+        self.assertTrue(snapshot['done'])
+        self.assertEqual(sum(snapshot['slice_histogram'].values()), 3)
+        self.assertEqual(snapshot['slice_histogram'][repr(0.00025)], 1)
+        self.assertEqual(snapshot['slice_histogram'][repr(0.005)], 1)
+        self.assertEqual(snapshot['slice_histogram'][repr(SLICE_BOUNDS[-1])],
+                         1)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        registry.clear()
+        registry.enable()
+
+    def tearDown(self):
+        registry.disable()
+        registry.clear()
+
+    @inlineCallbacks
+    def test_snapshot(self):
+        """
+        Ensure the tasks of batch_accumulate and accumulate are measured
+        once the registry is enabled.
+
+        :return:
+        """
+        result = yield defer.gatherResults([
+            batch_accumulate(3, i_numbers(10)),
+            accumulate(i_numbers(4))])
+        self.assertEqual(result, [deque(range(10)), deque(range(4))])
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['running'], 0)
+        self.assertEqual(snapshot['finished'], 2)
+        batched, single = snapshot['tasks']
+        self.assertEqual(batched['name'], 'i_numbers')
+        self.assertEqual(batched['items'], 10)
+        self.assertEqual(batched['slices'], 5)
+        self.assertEqual(single['items'], 4)
+        self.assertEqual(single['slices'], 5)
+        self.assertTrue(batched['done'])
+        self.assertEqual(sum(batched['slice_histogram'].values()), 5)
+
+    def test_running(self):
+        """
+        Ensure a running task is in the snapshot until it is stopped.
+
+        :return:
+        """
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: True,
+            scheduler=lambda tick: None)
+        d = batch_accumulate(2, i_numbers(10), cooperator)
+        cooperator._tick()
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['running'], 1)
+        self.assertEqual(snapshot['tasks'][0]['items'], 2)
+        self.assertFalse(snapshot['tasks'][0]['done'])
+
+        d.cancel()
+        self.failureResultOf(d, defer.CancelledError)
+        self.assertEqual(registry.snapshot()['running'], 0)
+
+    @inlineCallbacks
+    def test_disabled(self):
+        """
+        Ensure no task is measured while disabled.
+
+        :return:
+        """
+        registry.disable()
+        yield batch_accumulate(3, i_numbers(10))
+        self.assertEqual(registry.snapshot(),
+                         {'running': 0, 'finished': 0, 'tasks': []})
+
+    def test_keep_finished(self):
+        """
+        Ensure only keep_finished finished tasks are kept.
+
+        :return:
+        """
+        own_registry = MetricsRegistry(keep_finished=2)
+        own_registry.enable()
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: False,
+            scheduler=lambda tick: None)
+        for count in range(3):
+            items, own_cooperate = own_registry.instrument(
+                i_numbers(count), cooperator.cooperate)
+            own_cooperate(items)
+        cooperator._tick()
+
+        snapshot = own_registry.snapshot()
+        self.assertEqual(snapshot['finished'], 3)
+        self.assertEqual([task['items'] for task in snapshot['tasks']],
+                         [1, 2])
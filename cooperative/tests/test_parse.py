@@ -0,0 +1,89 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative.aggregate import StatsBucket
+from cooperative.parse import csv_rows
+from cooperative.parse import i_lines
+from cooperative.parse import json_lines
+from cooperative.parse import parse_lines
+
+
+class TestParse(unittest.TestCase):
+    def write(self, content):
+        """
+        :param content: Bytes to write to a new file.
+        :return: The path of the file.
+        """
+        path = self.mktemp()
+        with open(path, 'wb') as new_file:
+            new_file.write(content)
+        return path
+
+    def test_i_lines(self):
+        """
+        Ensure the lines are the same through mmap or buffered reads,
+        including a last line without a newline, or an empty file.
+
+        :return:
+        """
+        path = self.write(b'a\r\nbc\n\nd')
+        for use_mmap in (True, False):
+            self.assertEqual(list(i_lines(path, use_mmap)),
+                             [b'a\r\n', b'bc\n', b'\n', b'd'])
+            self.assertEqual(list(i_lines(self.write(b''), use_mmap)), [])
+
+    @inlineCallbacks
+    def test_parse_lines(self):
+        """
+        Ensure the parsed lines are accumulated in the spigot,
+        skipping those parsed to None.
+
+        :return:
+        """
+        path = self.write(b'1\n2\nskip\n3\n')
+
+        def parse(line):
+            line = line.strip()
+            return int(line) if line.isdigit() else None
+
+        result = yield parse_lines(path, parse, max_batch_size=2,
+                                   spigot=StatsBucket())
+        self.assertEqual(result['sum'], 6)
+
+    @inlineCallbacks
+    def test_json_lines(self):
+        """
+        Ensure each line of JSON is a value, and blank lines are skipped.
+
+        :return:
+        """
+        path = self.write(b'{"a": 1}\n\n[2, "\\u00e9"]\n')
+        for use_mmap in (True, False):
+            result = yield json_lines(path, use_mmap=use_mmap)
+            self.assertEqual(result, deque([{'a': 1}, [2, u'\xe9']]))
+
+        batches = []
+        result = yield json_lines(path, max_batch_size=1,
+                                  sink=batches.append)
+        self.assertEqual(batches, [deque([{'a': 1}]), deque([[2, u'\xe9']])])
+
+    @inlineCallbacks
+    def test_csv_rows(self):
+        """
+        Ensure a quoted field may span lines, and rows may be dicts.
+
+        :return:
+        """
+        path = self.write(b'name,note\r\nx,"two\nlines"\r\ny,z\r\n')
+        result = yield csv_rows(path)
+        self.assertEqual(result, deque([['name', 'note'],
+                                        ['x', 'two\nlines'],
+                                        ['y', 'z']]))
+
+        result = yield csv_rows(path, dict_rows=True, use_mmap=False)
+        self.assertEqual([dict(row) for row in result],
+                         [{'name': 'x', 'note': 'two\nlines'},
+                          {'name': 'y', 'note': 'z'}])
@@ -0,0 +1,124 @@
+# _*_ coding: utf-8 _*_
+from twisted.internet.task import Clock
+from twisted.internet.task import Cooperator
+from twisted.trial import unittest
+
+from cooperative.metrics import MetricsRegistry
+from cooperative.probe import LagHistogram
+from cooperative.probe import ResponsivenessProbe
+
+
+class TestLagHistogram(unittest.TestCase):
+    def test_percentiles(self):
+        """
+        Ensure percentiles are within the significant figures.
+
+        :return:
+        """
+        histogram = LagHistogram(significant_figures=2)
+        for millis in range(1, 101):
+            histogram.record(millis / 1000.0)
+
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.percentile(0.5), 0.050, places=3)
+        self.assertAlmostEqual(histogram.percentile(0.99), 0.099, places=3)
+        self.assertEqual(histogram.max, 0.1)
+        self.assertEqual(histogram.snapshot()['count'], 100)
+
+    def test_buckets(self):
+        """
+        Ensure durations are kept to the significant figures.
+
+        :return:
+        """
+        histogram = LagHistogram(significant_figures=2)
+        histogram.record(0.012345)
+        histogram.record(0.012399)
+        histogram.record(0.000042)
+
+        self.assertEqual(sorted(histogram._counts.items()),
+                         [(42, 1), (12000, 2)])
+
+    def test_empty(self):
+        """
+        Ensure an empty histogram has percentiles of 0.
+
+        :return:
+        """
+        self.assertEqual(LagHistogram().percentile(0.99), 0.0)
+
+
+class TestResponsivenessProbe(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.registry = MetricsRegistry(timer=self.clock.seconds)
+        self.registry.enable()
+        self.probe = ResponsivenessProbe(
+            interval=0.01, spike_threshold=0.05, clock=self.clock,
+            metrics_registry=self.registry)
+        self.probe.start()
+
+    def tearDown(self):
+        self.probe.stop()
+
+    def run_slices(self, costs):
+        """
+        Run one slice of an instrumented task for each cost,
+        which moves the clock forward without firing calls.
+
+        :param costs: Seconds each slice takes.
+        :return:
+        """
+        def i_costly():
+            for cost in costs:
+                self.clock.rightNow += cost
+                yield cost
+
+        cooperator = Cooperator(
+            terminationPredicateFactory=lambda: lambda: False,
+            scheduler=lambda tick: None)
+        items, own_cooperate = self.registry.instrument(
+            i_costly(), cooperator.cooperate)
+        own_cooperate(items)
+        cooperator._tick()
+
+    def test_lag(self):
+        """
+        Ensure heartbeats on time are recorded without spikes.
+
+        :return:
+        """
+        self.clock.pump([0.01] * 5)
+
+        snapshot = self.probe.snapshot()
+        self.assertEqual(snapshot['lag']['count'], 5)
+        self.assertEqual(snapshot['lag']['max'], 0.0)
+        self.assertEqual(snapshot['spikes'], [])
+
+    def test_spike(self):
+        """
+        Ensure a late heartbeat is kept as a spike, along with
+        the task of the longest slice since the previous one.
+
+        :return:
+        """
+        self.run_slices([0.001, 0.2, 0.002])
+        self.clock.advance(0)
+
+        snapshot = self.probe.snapshot()
+        self.assertEqual(snapshot['lag']['count'], 1)
+        self.assertAlmostEqual(snapshot['lag']['max'], 0.193)
+        spike, = snapshot['spikes']
+        self.assertEqual(spike['task'], 'i_costly')
+        self.assertEqual(spike['slice'], 0.2)
+        self.assertEqual(snapshot['spikes_by_task'], {'i_costly': 1})
+
+    def test_stop(self):
+        """
+        Ensure no heartbeat is scheduled after stop.
+
+        :return:
+        """
+        self.probe.stop()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.probe.start()
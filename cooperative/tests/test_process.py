@@ -0,0 +1,293 @@
+# _*_ coding: utf-8 _*_
+import os
+import pickle
+import signal
+import time
+from collections import deque
+from multiprocessing import Pool
+from operator import add
+
+from twisted.internet.defer import TimeoutError
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative.process import WorkerLost
+from cooperative.process import process_accumulate
+from cooperative.process import run_generator
+from cooperative.process import run_returning_errors
+from cooperative.process import shard_range
+from cooperative.process import sharded_reduce
+
+
+def i_squares(count):
+    """
+    Yield the squares of the first count numbers, except the odd ones.
+
+    :param count:
+    :return:
+    """
+    for value in range(count):
+        yield None if value % 2 else value * value
+
+
+def i_fail(count):
+    """
+    Yield count numbers, then raise an IndexError.
+
+    :param count:
+    :return:
+    """
+    for value in range(count):
+        yield value
+    raise IndexError(count)
+
+
+def i_range(start, stop):
+    """
+    Yield the numbers from start up to stop.
+
+    :param start:
+    :param stop:
+    :return:
+    """
+    for value in range(start, stop):
+        yield value
+
+
+def i_flaky(path, count):
+    """
+    Raise an IOError the first time it is run with path, then yield
+    count numbers.
+
+    :param path:
+    :param count:
+    :return:
+    """
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        raise IOError(path)
+    for value in range(count):
+        yield value
+
+
+def i_crash(path, count):
+    """
+    Kill the worker process the first time it is run with path, then
+    yield count numbers.
+
+    :param path:
+    :param count:
+    :return:
+    """
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        os._exit(1)
+    for value in range(count):
+        yield value
+
+
+def i_unpicklable(count):
+    """
+    Yield count generators, which can not be pickled.
+
+    :param count:
+    :return:
+    """
+    for value in range(count):
+        yield (value for _ in ())
+
+
+def i_slow(seconds):
+    """
+    Sleep for seconds, then yield it.
+
+    :param seconds:
+    :return:
+    """
+    time.sleep(seconds)
+    yield seconds
+
+
+def append_value(values, value):
+    return values + [value]
+
+
+def make_pool():
+    """
+    :return: A Pool of two worker processes, which do not keep
+     the SIGTERM handler of the reactor, so it can be terminated
+     even after a worker process died with a job outstanding.
+    """
+    return Pool(2, signal.signal, (signal.SIGTERM, signal.SIG_DFL))
+
+
+class TestRunGenerator(unittest.TestCase):
+    def test_run_generator(self):
+        """
+        Ensure run_generator returns the non-None values
+        of the generator made with the args.
+
+        :return:
+        """
+        self.assertEqual(run_generator(i_squares, (6,)), [0, 4, 16])
+
+    def test_run_returning_errors(self):
+        """
+        Ensure run_returning_errors returns the result, or the error
+        raised instead.
+
+        :return:
+        """
+        self.assertEqual(
+            run_returning_errors(run_generator, (i_squares, (6,))),
+            (True, [0, 4, 16]))
+        succeeded, error = run_returning_errors(run_generator, (i_fail, (3,)))
+        self.assertEqual((succeeded, type(error), error.args),
+                         (False, IndexError, (3,)))
+
+
+class TestProcessAccumulate(unittest.TestCase):
+    def setUp(self):
+        self.pool = make_pool()
+
+    def tearDown(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    @inlineCallbacks
+    def test_process_accumulate(self):
+        """
+        Ensure process_accumulate yields a deque of the non-None values
+        of the generator, iterated over in a worker process.
+
+        :return:
+        """
+        result = yield process_accumulate(i_squares, (10,), pool=self.pool,
+                                          max_batch_size=2)
+        self.assertEqual(result, deque([0, 4, 16, 36, 64]))
+
+    @inlineCallbacks
+    def test_failure(self):
+        """
+        Ensure an error raised in the worker process fails the Deferred.
+
+        :return:
+        """
+        d = process_accumulate(i_fail, (3,), pool=self.pool)
+        error = yield self.assertFailure(d, IndexError)
+        self.assertEqual(error.args, (3,))
+
+    @inlineCallbacks
+    def test_unpicklable(self):
+        """
+        Ensure the Deferred fails when the generator factory,
+        or the values yielded, can not be pickled.
+
+        :return:
+        """
+        d = process_accumulate(lambda: iter([1, 2]), pool=self.pool)
+        yield self.assertFailure(d, pickle.PicklingError)
+
+        d = process_accumulate(i_unpicklable, (2,), pool=self.pool)
+        yield self.assertFailure(d, pickle.PicklingError)
+
+    @inlineCallbacks
+    def test_worker_lost(self):
+        """
+        Ensure the Deferred fails with WorkerLost when the worker
+        process dies.
+
+        :return:
+        """
+        d = process_accumulate(i_crash, (self.mktemp(), 3), pool=self.pool,
+                               poll_interval=0.05)
+        yield self.assertFailure(d, WorkerLost)
+
+
+class TestShardRange(unittest.TestCase):
+    def test_shard_range(self):
+        """
+        Ensure shard_range splits a range into nearly equal shards.
+
+        :return:
+        """
+        self.assertEqual(shard_range(0, 10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(shard_range(5, 6, 2), [(5, 6), (6, 6)])
+
+
+class TestShardedReduce(unittest.TestCase):
+    def setUp(self):
+        self.pool = make_pool()
+
+    def tearDown(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    @inlineCallbacks
+    def test_sharded_reduce(self):
+        """
+        Ensure the result of each shard is merged in order.
+
+        :return:
+        """
+        result = yield sharded_reduce(i_range, shard_range(0, 100, 4),
+                                      add, 0, pool=self.pool)
+        self.assertEqual(result, sum(range(100)))
+
+        result = yield sharded_reduce(
+            i_range, shard_range(0, 6, 3), append_value, [], merge=add,
+            pool=self.pool)
+        self.assertEqual(result, list(range(6)))
+
+    @inlineCallbacks
+    def test_retry(self):
+        """
+        Ensure a shard which fails is run again, and fails the Deferred
+        once it runs out of retries.
+
+        :return:
+        """
+        path = self.mktemp()
+        result = yield sharded_reduce(i_flaky, [(path, 4)], add, 0,
+                                      pool=self.pool)
+        self.assertEqual(result, 6)
+
+        d = sharded_reduce(i_fail, [(3,), (1,)], add, 0, pool=self.pool)
+        error = yield self.assertFailure(d, IndexError)
+        self.assertEqual(error.args, (3,))
+
+    @inlineCallbacks
+    def test_timeout(self):
+        """
+        Ensure a shard which takes longer than timeout fails the
+        Deferred once it runs out of retries.
+
+        :return:
+        """
+        d = sharded_reduce(i_slow, [(0.5,)], add, 0, pool=self.pool,
+                           retries=0, timeout=0.05)
+        yield self.assertFailure(d, TimeoutError)
+
+    @inlineCallbacks
+    def test_worker_lost(self):
+        """
+        Ensure a shard whose worker process dies is run again,
+        without a timeout.
+
+        :return:
+        """
+        result = yield sharded_reduce(i_crash, [(self.mktemp(), 4)], add, 0,
+                                      pool=self.pool, poll_interval=0.05)
+        self.assertEqual(result, 6)
+
+    @inlineCallbacks
+    def test_unpicklable(self):
+        """
+        Ensure a shard whose fn can not be pickled fails the Deferred
+        with a PicklingError without a timeout or being run again.
+
+        :return:
+        """
+        d = sharded_reduce(i_range, [(0, 3)], lambda a, b: a + b, 0,
+                           pool=self.pool, retries=3)
+        yield self.assertFailure(d, pickle.PicklingError)
@@ -0,0 +1,98 @@
+# _*_ coding: utf-8 _*_
+from collections import deque
+from random import Random
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative.sort import cooperative_sort
+from cooperative.sort import i_merge
+from cooperative.sort import i_sorted_runs
+
+
+class TestSortedRuns(unittest.TestCase):
+    def test_i_sorted_runs(self):
+        """
+        Ensure the non-None values are yielded in sorted runs of at
+        least run_size, with None after each batch read.
+
+        :return:
+        """
+        values = [5, None, 3, 9, 1, 4, 2]
+        self.assertEqual(list(i_sorted_runs(values, 3, max_batch_size=2)),
+                         [None, [3, 5, 9], None, [1, 2, 4]])
+
+    def test_spill(self):
+        """
+        Ensure spilled runs read back sorted.
+
+        :return:
+        """
+        runs = [run for run in i_sorted_runs(range(10, 0, -1), 5,
+                                             max_batch_size=2, spill=True)
+                if run is not None]
+        self.assertEqual([list(run) for run in runs],
+                         [[5, 6, 7, 8, 9, 10], [1, 2, 3, 4]])
+        self.assertIsNot(runs[0]._spill_file, None)
+        for run in runs:
+            run.close()
+
+    def test_i_merge(self):
+        """
+        Ensure equal keys are merged in the order of their runs,
+        also in reverse.
+
+        :return:
+        """
+        runs = [[(1, 'a'), (2, 'b')], [(1, 'c'), (3, 'd')]]
+        self.assertEqual(list(i_merge(runs, key=lambda pair: pair[0])),
+                         [(1, 'a'), (1, 'c'), (2, 'b'), (3, 'd')])
+
+        runs = [[(2, 'b'), (1, 'a')], [(3, 'd'), (1, 'c')]]
+        self.assertEqual(
+            list(i_merge(runs, key=lambda pair: pair[0], reverse=True)),
+            [(3, 'd'), (2, 'b'), (1, 'a'), (1, 'c')])
+
+
+class TestCooperativeSort(unittest.TestCase):
+    def setUp(self):
+        random = Random(5)
+        self.values = [(random.randrange(50), index)
+                       for index in range(1000)]
+
+    @inlineCallbacks
+    def test_cooperative_sort(self):
+        """
+        Ensure the result is a stable sort like sorted,
+        with and without spilling.
+
+        :return:
+        """
+        def first(pair):
+            return pair[0]
+
+        for spill in (False, True):
+            result = yield cooperative_sort(iter(self.values), key=first,
+                                            run_size=64, max_batch_size=16,
+                                            spill=spill)
+            self.assertEqual(result, deque(sorted(self.values, key=first)))
+
+            result = yield cooperative_sort(iter(self.values), key=first,
+                                            reverse=True, run_size=100,
+                                            spill=spill)
+            self.assertEqual(
+                result, deque(sorted(self.values, key=first, reverse=True)))
+
+    @inlineCallbacks
+    def test_sink(self):
+        """
+        Ensure the sink is given each batch of sorted values.
+
+        :return:
+        """
+        batches = []
+        result = yield cooperative_sort(iter([3, None, 1, 2]), run_size=2,
+                                        max_batch_size=2,
+                                        sink=batches.append)
+        self.assertEqual(result, None)
+        self.assertEqual(batches, [deque([1, 2]), deque([3])])
@@ -0,0 +1,85 @@
+# _*_ coding: utf-8 _*_
+from array import array
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from cooperative import batch_accumulate
+from cooperative.spill import SpillBucket
+
+
+class TestSpillBucket(unittest.TestCase):
+    def test_pickle_spill(self):
+        """
+        Ensure values past max_in_memory are spilled, and read back
+        in order along with those still in memory.
+
+        :return:
+        """
+        bucket = SpillBucket(max_in_memory=3)
+        for value in ['a', None, 'b', 'c', 'd']:
+            bucket(value)
+        bucket.extend(['e', 'f', 'g'])
+
+        self.assertEqual(bucket._spilled, 7)
+        self.assertEqual(bucket._memory, [])
+        snapshot = bucket.contents()
+        bucket('h')
+        self.assertEqual(list(snapshot), list('abcdefg'))
+
+        contents = bucket.drain_contents()
+        self.assertEqual(len(contents), 8)
+        self.assertEqual(list(contents), list('abcdefgh'))
+        self.assertEqual(list(contents), list('abcdefgh'))
+        self.assertEqual(list(bucket.contents()), [])
+
+        contents.close()
+        self.assertEqual(list(contents), [])
+
+    def test_array_spill(self):
+        """
+        Ensure values of a typecode are spilled as a raw array,
+        all of them once drained, so they can be mapped.
+
+        :return:
+        """
+        bucket = SpillBucket(max_in_memory=4, typecode='l')
+        for value in range(10):
+            bucket(value)
+
+        contents = bucket.drain_contents()
+        contents._read_size = 3
+        self.assertEqual(list(contents), list(range(10)))
+
+        mapped = contents.mapped()
+        self.addCleanup(mapped.close)
+        expected = array('l', range(10))
+        to_bytes = getattr(expected, 'tobytes', None) or expected.tostring
+        self.assertEqual(mapped[:], to_bytes())
+
+    def test_not_spilled(self):
+        """
+        Ensure values under max_in_memory never touch a file.
+
+        :return:
+        """
+        bucket = SpillBucket(typecode='d')
+        bucket(1.5)
+        contents = bucket.drain_contents()
+        self.assertIs(contents._spill_file, None)
+        self.assertEqual(list(contents), [1.5])
+        self.assertRaises(ValueError, contents.mapped)
+        self.assertRaises(TypeError, SpillBucket().contents().mapped)
+
+    @inlineCallbacks
+    def test_batch_accumulate_spigot(self):
+        """
+        Ensure batch_accumulate accumulates in a given spigot.
+
+        :return:
+        """
+        result = yield batch_accumulate(
+            10, iter(range(25)), spigot=SpillBucket(max_in_memory=10))
+        self.addCleanup(result.close)
+        self.assertEqual(len(result._offsets), 2)
+        self.assertEqual(list(result), list(range(25)))